@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+r"""
+下载路径基准测试：比较 sendfile 零拷贝与缓冲拷贝每GB消耗的服务器CPU时间
+使用方法:
+python benchmarks/bench_sendfile.py --size-mb 512 --rounds 4
+
+每种模式各启动一次服务器子进程，在临时存储目录中下载同一个文件若干次，
+服务器退出后通过 os.wait4 取得其用户态/内核态CPU时间
+"""
+
+import os
+import sys
+import time
+import signal
+import socket
+import tempfile
+import subprocess
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "simple_file_server_v2.py")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(port, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("服务器启动超时")
+
+
+def download(port, filename):
+    # 用原始socket下载并丢弃内容，尽量减少客户端开销
+    sock = socket.create_connection(("127.0.0.1", port))
+    sock.sendall(f"GET /download?file={filename} HTTP/1.0\r\nHost: localhost\r\n\r\n".encode())
+    buf = bytearray(1024 * 1024)
+    total = 0
+    while True:
+        n = sock.recv_into(buf)
+        if not n:
+            break
+        total += n
+    sock.close()
+    return total
+
+
+def run_mode(storage_dir, filename, sendfile, rounds):
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, SERVER, "--port", str(port), "--storage-dir", storage_dir,
+         "--sendfile", "on" if sendfile else "off"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(port)
+        start = time.perf_counter()
+        received = 0
+        for _ in range(rounds):
+            received += download(port, filename)
+        wall = time.perf_counter() - start
+    finally:
+        proc.send_signal(signal.SIGINT)
+    _, _, usage = os.wait4(proc.pid, 0)
+    cpu = usage.ru_utime + usage.ru_stime
+    gb = received / (1024 ** 3)
+    return {
+        "gb": gb,
+        "wall": wall,
+        "cpu": cpu,
+        "user": usage.ru_utime,
+        "sys": usage.ru_stime,
+        "cpu_per_gb": cpu / gb if gb else 0.0,
+        "throughput": gb / wall if wall else 0.0,
+    }
+
+
+def main():
+    size_mb = 256
+    rounds = 4
+    for i in range(1, len(sys.argv), 2):
+        if sys.argv[i] == "--size-mb" and i + 1 < len(sys.argv):
+            size_mb = int(sys.argv[i + 1])
+        elif sys.argv[i] == "--rounds" and i + 1 < len(sys.argv):
+            rounds = int(sys.argv[i + 1])
+
+    with tempfile.TemporaryDirectory() as storage_dir:
+        filename = "bench.bin"
+        with open(os.path.join(storage_dir, filename), "wb") as f:
+            block = os.urandom(1024 * 1024)
+            for _ in range(size_mb):
+                f.write(block)
+
+        print(f"文件大小: {size_mb} MB, 每种模式下载 {rounds} 次")
+        print(f"{'模式':<10}{'数据量(GB)':>12}{'耗时(s)':>10}{'GB/s':>8}{'CPU(s)':>10}{'user':>8}{'sys':>8}{'CPU s/GB':>10}")
+        for name, sendfile in (("sendfile", True), ("buffered", False)):
+            r = run_mode(storage_dir, filename, sendfile, rounds)
+            print(f"{name:<10}{r['gb']:>12.2f}{r['wall']:>10.2f}{r['throughput']:>8.2f}"
+                  f"{r['cpu']:>10.2f}{r['user']:>8.2f}{r['sys']:>8.2f}{r['cpu_per_gb']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
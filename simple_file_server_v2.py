@@ -7,25 +7,2417 @@ r"""
 python simple_file_server.py --port 8000
 
 默认端口: 8000
+
+可选参数:
+--storage-dir DIR    文件存储目录（默认使用 STORAGE_DIR）
+--sendfile on|off    下载是否使用sendfile零拷贝（默认 on）
+--threads N          固定大小的工作线程池（默认 0，即每个连接一个线程）
+--backlog N          监听socket的accept队列长度（默认 128）
+--queue-size N       线程池满时最多排队等待的连接数（默认 256）
+--retry-after N      排队也满时返回503，Retry-After的秒数（默认 5）
+--engine NAME        服务器引擎：threading（默认）或 asyncio
 """
 
 import http.server
+import http.client
 import socketserver
 import os
 import sys
 import io
+import socket
+import re
+import json
+import time
+import uuid
+import queue
+import asyncio
+import datetime
+import email.parser
+import base64
+import bisect
+import stat
+import threading
+import email.utils
+import gzip
+import hashlib
+import urllib.parse
+from html import escape as html_escape
+
+# brotli为可选依赖，未安装时静态页面只提供gzip压缩版本
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 # 全局配置 - 用户只需修改此行为自己的存储路径
 STORAGE_DIR = r"/var/lib/kubernetes-storage/file_upload/file_container"
 
+# 上传时每次从socket读取的块大小
+UPLOAD_CHUNK_SIZE = 256 * 1024
+# 单个part头部的最大长度，防止恶意请求撑爆内存
+MAX_PART_HEADER_SIZE = 16 * 1024
+# 下载是否使用sendfile零拷贝（可通过 --sendfile off 关闭）
+USE_SENDFILE = True
+# 无法使用sendfile时缓冲拷贝的块大小
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+# 单个请求最多处理的Range数量，超出时合并为一个覆盖全部的范围
+MAX_RANGES = 64
+# 可续传上传会话的存放目录（位于STORAGE_DIR下，保证与最终文件在同一文件系统）
+UPLOAD_SESSION_DIR_NAME = ".upload_sessions"
+# 上传会话超过该时间（秒）没有活动即被清理
+UPLOAD_SESSION_TTL = 24 * 3600
+# 文件索引轮询目录mtime的间隔（秒），以及不论mtime是否变化都完整重扫的间隔
+FILE_INDEX_POLL_INTERVAL = 2
+FILE_INDEX_RESCAN_INTERVAL = 300
+# 预编码静态页面（/ 和 /upload）的缓存策略
+STATIC_PAGE_CACHE_CONTROL = "public, max-age=300, must-revalidate"
+# 下载页面每页显示的文件数
+DOWNLOAD_PAGE_SIZE = 500
+# /api/files 默认和最大的单页条数
+API_FILES_DEFAULT_LIMIT = 100
+API_FILES_MAX_LIMIT = 1000
+# 按大小/时间排序并带前缀过滤时，单次请求最多检查的条目数，保证响应时间有上界
+API_FILES_SCAN_LIMIT = 20000
+
+
+class MultipartError(Exception):
+    """multipart请求体格式错误"""
+
+
+class MultipartReader:
+    """
+    增量multipart/form-data解析器
+    按固定大小的块读取请求体，跨块查找boundary，
+    每个part的内容以块的形式交给调用方，内存占用与文件大小无关
+    """
+
+    def __init__(self, rfile, boundary, content_length, chunk_size=UPLOAD_CHUNK_SIZE):
+        self.rfile = rfile
+        self.remaining = content_length
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+        self.boundary = b'--' + boundary
+        # part内容之后的分隔符（前面带CRLF）
+        self.delimiter = b'\r\n' + self.boundary
+        self.finished = False
+
+    def _fill(self):
+        # 从socket再读一块到缓冲区，没有更多数据时返回False
+        if self.remaining <= 0:
+            return False
+        data = self.rfile.read(min(self.chunk_size, self.remaining))
+        if not data:
+            raise MultipartError("请求体提前结束")
+        self.remaining -= len(data)
+        self.buffer += data
+        return True
+
+    def _drain(self):
+        # 丢弃结束boundary之后剩余的内容（epilogue），保证连接上的数据被读完
+        self.buffer.clear()
+        while self.remaining > 0:
+            data = self.rfile.read(min(self.chunk_size, self.remaining))
+            if not data:
+                break
+            self.remaining -= len(data)
+
+    def _read_until(self, marker, limit):
+        # 读取直到缓冲区中出现marker，返回marker之前的内容并消耗marker
+        while True:
+            pos = self.buffer.find(marker)
+            if pos != -1:
+                data = bytes(self.buffer[:pos])
+                del self.buffer[:pos + len(marker)]
+                return data
+            if len(self.buffer) > limit:
+                raise MultipartError("part头部过长")
+            if not self._fill():
+                raise MultipartError("multipart格式错误")
+
+    def _after_boundary(self):
+        # boundary之后是"--"（结束）或CRLF（下一个part）
+        while len(self.buffer) < 2:
+            if not self._fill():
+                raise MultipartError("multipart格式错误")
+        if self.buffer[:2] == b'--':
+            self.finished = True
+            self._drain()
+            return False
+        # 跳过boundary行末尾可能存在的空白
+        self._read_until(b'\r\n', MAX_PART_HEADER_SIZE)
+        return True
+
+    def _iter_body(self):
+        # 逐块产出part内容，直到遇到下一个分隔符
+        keep = len(self.delimiter) - 1
+        while True:
+            pos = self.buffer.find(self.delimiter)
+            if pos != -1:
+                if pos:
+                    yield bytes(self.buffer[:pos])
+                del self.buffer[:pos + len(self.delimiter)]
+                return
+            # 保留末尾可能是分隔符前缀的部分，其余内容可以安全输出
+            if len(self.buffer) > keep:
+                cut = len(self.buffer) - keep
+                yield bytes(self.buffer[:cut])
+                del self.buffer[:cut]
+            if not self._fill():
+                raise MultipartError("请求体提前结束")
+
+    def parts(self):
+        """
+        依次产出 (headers, body_iter)
+        headers为part头部字符串，body_iter为内容块迭代器；
+        调用方不需要的part可以不读取，剩余内容会被自动跳过
+        """
+        # 跳过第一个boundary之前的前导内容
+        self._read_until(self.boundary, len(self.boundary) + MAX_PART_HEADER_SIZE)
+        while self._after_boundary():
+            headers = self._read_until(b'\r\n\r\n', MAX_PART_HEADER_SIZE)
+            body = self._iter_body()
+            yield headers.decode('utf-8', 'replace'), body
+            # 跳过调用方未读完的内容
+            for _ in body:
+                pass
+
+
+def parse_part_filename(headers):
+    # 从part头部中取出filename，非文件字段返回None
+    if 'filename="' not in headers:
+        return None
+    filename_start = headers.find('filename="') + 10
+    filename_end = headers.find('"', filename_start)
+    return os.path.basename(headers[filename_start:filename_end]) or None
+
+
+def parse_range_header(value, size):
+    """
+    解析Range请求头，返回按起点排序并合并后的 [(start, end), ...]（end包含在内）
+    格式无法识别时返回None（按普通请求返回完整文件），没有可满足的范围时返回[]
+    """
+    if not value:
+        return None
+    unit, _, specs = value.partition('=')
+    if unit.strip().lower() != 'bytes' or not specs:
+        return None
+    ranges = []
+    for spec in specs.split(','):
+        spec = spec.strip()
+        if not spec:
+            continue
+        first, sep, last = spec.partition('-')
+        if not sep:
+            return None
+        first, last = first.strip(), last.strip()
+        if not (first.isdigit() or first == '') or not (last.isdigit() or last == ''):
+            return None
+        if first == '':
+            # 后缀范围 bytes=-N 表示最后N个字节
+            if not last:
+                return None
+            suffix = int(last)
+            if suffix == 0 or size == 0:
+                continue
+            ranges.append((max(size - suffix, 0), size - 1))
+        else:
+            start = int(first)
+            if last and int(last) < start:
+                return None
+            if start >= size:
+                continue
+            end = int(last) if last else size - 1
+            ranges.append((start, min(end, size - 1)))
+    if not ranges:
+        return []
+    # 合并重叠或相邻的范围，防止客户端用大量小范围放大响应
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    if len(merged) > MAX_RANGES:
+        merged = [(merged[0][0], merged[-1][1])]
+    return merged
+
+
+def if_range_matches(value, st):
+    # If-Range中的日期与文件修改时间一致时才允许返回部分内容
+    if not value:
+        return True
+    value = value.strip()
+    if value.startswith('"') or value.startswith('W/'):
+        return False
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp() == int(st.st_mtime)
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return False
+
+
+def copy_file_buffered(wfile, f, offset, count):
+    # 普通的读取+写入拷贝，用于TLS等无法使用sendfile的场景
+    f.seek(offset)
+    sent = 0
+    while sent < count:
+        chunk = f.read(min(DOWNLOAD_CHUNK_SIZE, count - sent))
+        if not chunk:
+            break
+        wfile.write(chunk)
+        sent += len(chunk)
+    return sent
+
+
+def send_file_range(handler, f, offset, count):
+    """
+    把文件f中[offset, offset+count)的内容发送给客户端
+    优先使用sendfile由内核直接把文件页拷贝到socket，
+    socket被包装（如TLS）或系统不支持时自动退回缓冲拷贝
+    """
+    if count <= 0:
+        return 0
+    sock = handler.connection
+    # 只有原生socket才能安全使用sendfile，ssl.SSLSocket等子类会绕过加密层
+    if USE_SENDFILE and hasattr(os, 'sendfile') and type(sock) is socket.socket:
+        handler.wfile.flush()
+        try:
+            return sock.sendfile(f, offset, count)
+        except (AttributeError, io.UnsupportedOperation):
+            # 文件对象不支持fileno（如内存文件），退回缓冲拷贝
+            pass
+    return copy_file_buffered(handler.wfile, f, offset, count)
+
+class UploadSessionError(Exception):
+    """上传会话请求错误，携带应返回的HTTP状态码"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class UploadSessionStore:
+    """
+    可续传上传会话（参考tus协议）
+    每个会话在会话目录下对应 <id>.part（数据）和 <id>.json（元数据），
+    数据块可以按任意偏移写入，已收到的区间记录在元数据中，
+    服务器重启后会话仍然有效，长时间未活动的会话会被清理
+    """
+
+    ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+    def __init__(self, root, ttl=UPLOAD_SESSION_TTL):
+        self.root = root
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.session_locks = {}
+        os.makedirs(self.root, exist_ok=True)
+
+    def _paths(self, upload_id):
+        if not self.ID_PATTERN.match(upload_id):
+            raise UploadSessionError(404, "上传会话不存在")
+        base = os.path.join(self.root, upload_id)
+        return base + ".json", base + ".part"
+
+    def _session_lock(self, upload_id):
+        with self.lock:
+            return self.session_locks.setdefault(upload_id, threading.Lock())
+
+    def _load(self, upload_id):
+        meta_path, _ = self._paths(upload_id)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UploadSessionError(404, "上传会话不存在或已过期")
+
+    def _save(self, meta):
+        # 先写临时文件再替换，避免崩溃时留下半截元数据
+        meta_path, _ = self._paths(meta['id'])
+        tmp_path = meta_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    def _discard(self, upload_id):
+        for path in self._paths(upload_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        with self.lock:
+            self.session_locks.pop(upload_id, None)
+
+    @staticmethod
+    def offset(meta):
+        # 从0开始连续收到的字节数，客户端从这里继续上传
+        ranges = meta['ranges']
+        if ranges and ranges[0][0] == 0:
+            return ranges[0][1]
+        return 0
+
+    def create(self, filename, length):
+        filename = os.path.basename(filename or '')
+        if not filename or filename == UPLOAD_SESSION_DIR_NAME:
+            raise UploadSessionError(400, "无效的文件名")
+        if length < 0:
+            raise UploadSessionError(400, "无效的Upload-Length")
+        upload_id = uuid.uuid4().hex
+        _, part_path = self._paths(upload_id)
+        open(part_path, 'wb').close()
+        now = time.time()
+        meta = {
+            'id': upload_id,
+            'filename': filename,
+            'length': length,
+            'ranges': [],
+            'created': now,
+            'updated': now,
+        }
+        if length == 0:
+            self._finalize(meta)
+            meta['completed'] = True
+            return meta
+        self._save(meta)
+        return meta
+
+    def get(self, upload_id):
+        return self._load(upload_id)
+
+    def delete(self, upload_id):
+        with self._session_lock(upload_id):
+            self._load(upload_id)
+            self._discard(upload_id)
+
+    def begin_write(self, upload_id, offset, count):
+        """检查数据块范围并打开会话文件，返回用于pwrite的文件描述符"""
+        meta = self._load(upload_id)
+        if offset < 0 or offset + count > meta['length']:
+            raise UploadSessionError(400, "数据块超出声明的文件大小")
+        _, part_path = self._paths(upload_id)
+        return os.open(part_path, os.O_WRONLY)
+
+    def end_write(self, upload_id, offset, position, expected_end):
+        """
+        记录 [offset, position) 已经写入，返回更新后的元数据
+        全部数据到齐时文件被原子地移动到STORAGE_DIR
+        """
+        with self._session_lock(upload_id):
+            meta = self._load(upload_id)
+            if position > offset:
+                meta['ranges'] = self._merge(meta['ranges'] + [[offset, position]])
+            meta['updated'] = time.time()
+            if meta['ranges'] == [[0, meta['length']]]:
+                self._finalize(meta)
+                meta['completed'] = True
+            else:
+                self._save(meta)
+        if position < expected_end:
+            raise UploadSessionError(400, "请求体提前结束")
+        return meta
+
+    def write(self, upload_id, offset, rfile, count):
+        """把请求体中的count个字节写入会话文件的offset处"""
+        fd = self.begin_write(upload_id, offset, count)
+        position = offset
+        try:
+            # 使用pwrite按偏移写入，同一会话的多个数据块可以并行上传
+            remaining = count
+            while remaining > 0:
+                data = rfile.read(min(UPLOAD_CHUNK_SIZE, remaining))
+                if not data:
+                    break
+                os.pwrite(fd, data, position)
+                position += len(data)
+                remaining -= len(data)
+        finally:
+            os.close(fd)
+        return self.end_write(upload_id, offset, position, offset + count)
+
+    @staticmethod
+    def _merge(ranges):
+        ranges.sort()
+        merged = [list(ranges[0])]
+        for start, end in ranges[1:]:
+            if start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return merged
+
+    def _finalize(self, meta):
+        # 同一文件系统内rename是原子的，下载方不会看到写了一半的文件
+        _, part_path = self._paths(meta['id'])
+        os.replace(part_path, os.path.join(STORAGE_DIR, meta['filename']))
+        self._discard(meta['id'])
+
+    def cleanup(self):
+        # 清理过期会话及没有元数据的残留数据文件
+        deadline = time.time() - self.ttl
+        removed = 0
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            upload_id = name.split('.', 1)[0]
+            try:
+                if name.endswith('.json'):
+                    with open(path, 'r', encoding='utf-8') as f:
+                        expired = json.load(f)['updated'] < deadline
+                else:
+                    expired = os.path.getmtime(path) < deadline
+            except (OSError, ValueError, KeyError):
+                continue
+            if expired and self.ID_PATTERN.match(upload_id):
+                with self._session_lock(upload_id):
+                    self._discard(upload_id)
+                removed += 1
+        return removed
+
+    def start_cleanup_thread(self, interval=600):
+        def run():
+            while True:
+                try:
+                    self.cleanup()
+                except Exception as e:
+                    print(f"清理上传会话失败: {e}")
+                time.sleep(interval)
+        threading.Thread(target=run, name="upload-session-cleanup", daemon=True).start()
+
+
+class FileIndex:
+    """
+    STORAGE_DIR的内存文件索引：文件名 -> (大小, 修改时间)
+    启动时扫描一次，之后由服务器自身的上传路径增量更新，
+    外部对目录的修改通过轮询目录mtime发现；
+    文件名保存在有序列表中，按页读取的开销只与页大小有关
+    """
+
+    SORT_KEYS = ('name', 'size', 'mtime')
+
+    def __init__(self, root):
+        self.root = root
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.names = []
+        # 按大小、修改时间排序的 (值, 文件名) 列表，供JSON接口分页使用
+        self.by_size = []
+        self.by_mtime = []
+        self.dir_mtime = None
+        self.rescan()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def rescan(self):
+        # 完整扫描目录，scandir在大多数平台上可以直接给出文件类型，减少stat次数
+        dir_mtime = os.stat(self.root).st_mtime_ns
+        entries = {}
+        with os.scandir(self.root) as it:
+            for entry in it:
+                try:
+                    if entry.is_file():
+                        st = entry.stat()
+                        entries[entry.name] = (st.st_size, st.st_mtime)
+                except OSError:
+                    continue
+        names = sorted(entries)
+        by_size = sorted((size, name) for name, (size, _) in entries.items())
+        by_mtime = sorted((mtime, name) for name, (_, mtime) in entries.items())
+        with self.lock:
+            self.entries = entries
+            self.names = names
+            self.by_size = by_size
+            self.by_mtime = by_mtime
+            self.dir_mtime = dir_mtime
+
+    def update(self, name):
+        # 服务器自己写入/删除文件后调用，只stat这一个文件
+        try:
+            st = os.stat(os.path.join(self.root, name))
+            is_file = stat.S_ISREG(st.st_mode)
+        except OSError:
+            is_file = False
+        with self.lock:
+            old = self.entries.pop(name, None)
+            if old is not None:
+                self._remove_sorted(name, old)
+            if is_file:
+                self.entries[name] = (st.st_size, st.st_mtime)
+                bisect.insort(self.names, name)
+                bisect.insort(self.by_size, (st.st_size, name))
+                bisect.insort(self.by_mtime, (st.st_mtime, name))
+            # 自身的修改已经反映在索引中，记录新的目录mtime避免触发重扫
+            try:
+                self.dir_mtime = os.stat(self.root).st_mtime_ns
+            except OSError:
+                pass
+
+    def _remove_sorted(self, name, entry):
+        size, mtime = entry
+        del self.names[bisect.bisect_left(self.names, name)]
+        del self.by_size[bisect.bisect_left(self.by_size, (size, name))]
+        del self.by_mtime[bisect.bisect_left(self.by_mtime, (mtime, name))]
+
+    def get(self, name):
+        with self.lock:
+            return self.entries.get(name)
+
+    def query(self, sort='name', descending=False, prefix='', after=None, limit=API_FILES_DEFAULT_LIMIT,
+              scan_limit=API_FILES_SCAN_LIMIT):
+        """
+        按游标分页查询
+        after为上一页最后一项的排序键（name排序为文件名，其余为[值, 文件名]），
+        返回 ([(文件名, 大小, 修改时间), ...], 下一页的排序键或None)
+        """
+        items = []
+        with self.lock:
+            if sort == 'name':
+                keys = self.names
+                if after is not None:
+                    after = str(after)
+            else:
+                keys = self.by_size if sort == 'size' else self.by_mtime
+                if after is not None:
+                    after = (after[0], str(after[1]))
+
+            if not descending:
+                if after is not None:
+                    pos = bisect.bisect_right(keys, after)
+                elif sort == 'name':
+                    # 按文件名排序时前缀匹配的条目是连续的一段，直接定位
+                    pos = bisect.bisect_left(keys, prefix)
+                else:
+                    pos = 0
+                indexes = range(pos, len(keys))
+            else:
+                if after is not None:
+                    pos = bisect.bisect_left(keys, after)
+                elif sort == 'name' and prefix:
+                    pos = bisect.bisect_left(keys, prefix + '\U0010ffff')
+                else:
+                    pos = len(keys)
+                indexes = range(pos - 1, -1, -1)
+
+            scanned = 0
+            for i in indexes:
+                key = keys[i]
+                name = key if sort == 'name' else key[1]
+                if not name.startswith(prefix):
+                    if sort == 'name':
+                        # 已经越过了前缀范围，后面不会再有匹配项
+                        return items, None
+                    scanned += 1
+                    if scanned >= scan_limit:
+                        # 检查的条目数达到上限，带游标返回，由客户端继续翻页
+                        return items, key
+                    continue
+                items.append((name,) + self.entries[name])
+                scanned += 1
+                if len(items) >= limit or scanned >= scan_limit:
+                    has_more = (i + 1 < len(keys)) if not descending else i > 0
+                    return items, (key if has_more else None)
+            return items, None
+
+    def page(self, offset, limit):
+        # 返回 (文件总数, [(文件名, 大小, 修改时间), ...])
+        with self.lock:
+            names = self.names[offset:offset + limit]
+            return len(self.names), [(name,) + self.entries[name] for name in names]
+
+    def poll(self):
+        # 目录mtime变化说明有外部的增删改名，重新扫描
+        try:
+            dir_mtime = os.stat(self.root).st_mtime_ns
+        except OSError:
+            return False
+        if dir_mtime != self.dir_mtime:
+            self.rescan()
+            return True
+        return False
+
+    def start_watch_thread(self, interval=FILE_INDEX_POLL_INTERVAL, rescan_interval=FILE_INDEX_RESCAN_INTERVAL):
+        def run():
+            last_rescan = time.monotonic()
+            while True:
+                time.sleep(interval)
+                try:
+                    if self.poll():
+                        last_rescan = time.monotonic()
+                    elif time.monotonic() - last_rescan >= rescan_interval:
+                        # 原地修改文件内容不会改变目录mtime，定期完整重扫兜底
+                        self.rescan()
+                        last_rescan = time.monotonic()
+                except Exception as e:
+                    print(f"刷新文件索引失败: {e}")
+        threading.Thread(target=run, name="file-index-watch", daemon=True).start()
+
+
+def encode_cursor(sort, key):
+    # 游标中保存排序方式和上一页最后一项的排序键，对客户端是不透明的字符串
+    raw = json.dumps([sort, key], ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(sort, cursor):
+    # 解析游标，格式不对或排序方式不一致时抛出ValueError
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, key = json.loads(raw.decode('utf-8'))
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ValueError("无效的cursor")
+    if cursor_sort != sort:
+        raise ValueError("cursor与排序方式不一致")
+    if sort == 'name':
+        if not isinstance(key, str):
+            raise ValueError("无效的cursor")
+        return key
+    if (not isinstance(key, list) or len(key) != 2 or not isinstance(key[0], (int, float))
+            or not isinstance(key[1], str)):
+        raise ValueError("无效的cursor")
+    return tuple(key)
+
+
+def format_size(size_bytes):
+    # 格式化文件大小
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size_bytes < 1024.0:
+            return f"{size_bytes:.2f} {unit}"
+        size_bytes /= 1024.0
+    return f"{size_bytes:.2f} TB"
+
+
+def render_file_rows(entries):
+    # 根据索引中的一页文件生成表格行
+    rows = []
+    for name, size, _ in entries:
+        escaped = html_escape(name)
+        rows.append(f'''<tr>
+                        <td>{escaped}</td>
+                        <td>{format_size(size)}</td>
+                        <td><a href="/download?file={urllib.parse.quote(name)}" class="btn-small">下载</a></td>
+                    </tr>''')
+    return ''.join(rows)
+
+
+def parse_upload_metadata(value):
+    # 解析tus风格的Upload-Metadata: "key base64value,key2 base64value2"
+    metadata = {}
+    for item in (value or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        key, _, encoded = item.partition(' ')
+        try:
+            metadata[key] = base64.b64decode(encoded.strip()).decode('utf-8')
+        except (ValueError, UnicodeDecodeError):
+            raise UploadSessionError(400, "无效的Upload-Metadata")
+    return metadata
+
+
+def parse_accept_encoding(value):
+    # 解析Accept-Encoding，返回 {编码: q值}
+    encodings = {}
+    for item in (value or '').split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        encodings[name] = q
+    return encodings
+
+
+def etag_matches(if_none_match, etags):
+    # If-None-Match中任意一个ETag与当前ETag相同（或为*）即视为命中
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag == '*':
+            return True
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag in etags:
+            return True
+    return False
+
+
+class StaticPage:
+    """
+    启动时预先编码好的静态页面
+    同时保存原始、gzip以及（可用时）brotli压缩后的字节，每个版本有各自的强ETag
+    """
+
+    def __init__(self, html, content_type="text/html; charset=utf-8"):
+        self.content_type = content_type
+        body = html.encode('utf-8')
+        digest = hashlib.sha256(body).hexdigest()[:16]
+        # 编码 -> (内容, ETag)
+        self.variants = {'identity': (body, f'"{digest}"')}
+        self.variants['gzip'] = (gzip.compress(body, 9, mtime=0), f'"{digest}-gz"')
+        if brotli is not None:
+            self.variants['br'] = (brotli.compress(body), f'"{digest}-br"')
+        self.etags = {etag for _, etag in self.variants.values()}
+
+    def respond(self, request_headers):
+        """根据请求头返回 (状态码, 响应头列表, 响应体)"""
+        encoding = self.choose(request_headers.get('Accept-Encoding'))
+        body, etag = self.variants[encoding]
+        headers = [
+            ("ETag", etag),
+            ("Cache-Control", STATIC_PAGE_CACHE_CONTROL),
+            ("Vary", "Accept-Encoding"),
+        ]
+        if etag_matches(request_headers.get('If-None-Match'), self.etags):
+            return 304, headers, b''
+        headers.append(("Content-type", self.content_type))
+        headers.append(("Content-Length", str(len(body))))
+        if encoding != 'identity':
+            headers.append(("Content-Encoding", encoding))
+        return 200, headers, body
+
+    def choose(self, accept_encoding):
+        # 在客户端接受的编码中选择体积最小的版本
+        accepted = parse_accept_encoding(accept_encoding)
+        best = 'identity'
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and accepted.get(encoding, accepted.get('*', 0)) > 0:
+                if len(self.variants[encoding][0]) < len(self.variants[best][0]):
+                    best = encoding
+        return best
+
+
+def http_date(timestamp):
+    return email.utils.formatdate(timestamp, usegmt=True)
+
+
+def content_disposition(filename):
+    # 响应头只能是latin-1，非ASCII文件名按RFC 5987放在filename*中
+    fallback = filename.encode('ascii', 'replace').decode('ascii').replace('"', '_')
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{urllib.parse.quote(filename)}"
+
+
+class FileResponse:
+    """
+    一次文件下载响应的计划，与具体的服务器引擎无关
+    segments为依次发送的 (前缀字节, 文件偏移, 长度)，最后再发送trailer
+    """
+
+    def __init__(self, status, headers, segments=(), trailer=b''):
+        self.status = status
+        self.headers = headers
+        self.segments = list(segments)
+        self.trailer = trailer
+
+
+def plan_file_response(request_headers, st, filename):
+    # 根据Range/If-Range请求头决定返回完整文件、单段、多段还是416
+    file_size = st.st_size
+    ranges = None
+    if if_range_matches(request_headers.get('If-Range'), st):
+        ranges = parse_range_header(request_headers.get('Range'), file_size)
+
+    if ranges == []:
+        # 请求的范围都超出了文件大小
+        return FileResponse(416, [("Content-Range", f"bytes */{file_size}"), ("Content-Length", "0")])
+
+    headers = [
+        ("Accept-Ranges", "bytes"),
+        ("Last-Modified", http_date(int(st.st_mtime))),
+        ("Content-Disposition", content_disposition(filename)),
+    ]
+    if not ranges:
+        headers.append(("Content-type", "application/octet-stream"))
+        headers.append(("Content-Length", str(file_size)))
+        return FileResponse(200, headers, [(b'', 0, file_size)])
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers.append(("Content-type", "application/octet-stream"))
+        headers.append(("Content-Range", f"bytes {start}-{end}/{file_size}"))
+        headers.append(("Content-Length", str(end - start + 1)))
+        return FileResponse(206, headers, [(b'', start, end - start + 1)])
+
+    # 多个范围使用multipart/byteranges，每段直接从文件对应偏移读取
+    boundary = uuid.uuid4().hex
+    segments = [
+        ((f"\r\n--{boundary}\r\n"
+          f"Content-Type: application/octet-stream\r\n"
+          f"Content-Range: bytes {start}-{end}/{file_size}\r\n\r\n").encode('latin-1'), start, end - start + 1)
+        for start, end in ranges
+    ]
+    trailer = f"\r\n--{boundary}--\r\n".encode('latin-1')
+    content_length = sum(len(prefix) + count for prefix, _, count in segments) + len(trailer)
+    headers.append(("Content-type", f"multipart/byteranges; boundary={boundary}"))
+    headers.append(("Content-Length", str(content_length)))
+    return FileResponse(206, headers, segments, trailer)
+
+
+def api_files(file_index, query):
+    """
+    GET /api/files?sort=name|size|mtime&order=asc|desc&prefix=...&limit=N&cursor=...
+    返回 (状态码, {"files": [{"name", "size", "mtime"}], "next_cursor": ..., "total": ...})
+    next_cursor为null表示没有更多数据；前缀过滤下返回的条目可能少于limit，但仍可继续翻页
+    """
+    sort = query.get('sort', ['name'])[0]
+    order = query.get('order', ['asc'])[0]
+    prefix = query.get('prefix', [''])[0]
+    if sort not in FileIndex.SORT_KEYS or order not in ('asc', 'desc'):
+        return 400, {"error": "sort必须为name/size/mtime，order必须为asc/desc"}
+    try:
+        limit = int(query.get('limit', [API_FILES_DEFAULT_LIMIT])[0])
+        after = None
+        if query.get('cursor', [''])[0]:
+            after = decode_cursor(sort, query['cursor'][0])
+    except ValueError as e:
+        return 400, {"error": str(e)}
+    limit = min(max(limit, 1), API_FILES_MAX_LIMIT)
+
+    items, next_key = file_index.query(sort, order == 'desc', prefix, after, limit)
+    return 200, {
+        "files": [{"name": name, "size": size, "mtime": mtime} for name, size, mtime in items],
+        "next_cursor": encode_cursor(sort, next_key) if next_key is not None else None,
+        "total": len(file_index),
+    }
+
+
+def upload_session_headers(meta=None, ttl=UPLOAD_SESSION_TTL, location=None):
+    # 上传会话接口的响应头
+    headers = [("Tus-Resumable", "1.0.0"), ("Cache-Control", "no-store")]
+    if location:
+        headers.append(("Location", location))
+    if meta is not None:
+        headers.append(("Upload-Length", str(meta['length'])))
+        if meta.get('completed'):
+            headers.append(("Upload-Offset", str(meta['length'])))
+            headers.append(("Upload-Complete", "1"))
+        else:
+            headers.append(("Upload-Offset", str(UploadSessionStore.offset(meta))))
+            headers.append(("Upload-Expires", http_date(int(meta['updated'] + ttl))))
+    headers.append(("Content-Length", "0"))
+    return headers
+
+
+def parse_session_create(request_headers):
+    # 解析创建上传会话的请求头，返回 (文件名, 总大小)
+    metadata = parse_upload_metadata(request_headers.get('Upload-Metadata'))
+    try:
+        length = int(request_headers.get('Upload-Length', ''))
+    except ValueError:
+        raise UploadSessionError(400, "缺少Upload-Length")
+    return metadata.get('filename'), length
+
+
+def parse_session_patch(request_headers):
+    # 解析写入数据块的请求头，返回 (偏移, 长度)
+    if request_headers.get('Content-Type') != 'application/offset+octet-stream':
+        raise UploadSessionError(415, "Content-Type必须为application/offset+octet-stream")
+    try:
+        return int(request_headers.get('Upload-Offset', '')), int(request_headers.get('Content-Length', ''))
+    except ValueError:
+        raise UploadSessionError(400, "缺少Upload-Offset或Content-Length")
+
+
+def parse_multipart_boundary(content_type):
+    # 从Content-Type中取出boundary，不是multipart/form-data时返回None
+    if not content_type or not content_type.startswith('multipart/form-data') or 'boundary=' not in content_type:
+        return None
+    return content_type.split('boundary=')[1].split(';')[0].strip().strip('"').encode('utf-8')
+
+
+# 主页面
+INDEX_PAGE_HTML = '''
+<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>文件服务</title>
+    <style>
+        body {
+            font-family: Arial, sans-serif;
+            max-width: 600px;
+            margin: 50px auto;
+            text-align: center;
+            background-color: #f0f0f0;
+        }
+        .container {
+            background: white;
+            padding: 40px;
+            border-radius: 10px;
+            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
+        }
+        h1 {
+            color: #333;
+        }
+        .btn {
+            display: inline-block;
+            background-color: #4CAF50;
+            color: white;
+            padding: 15px 30px;
+            text-decoration: none;
+            font-size: 18px;
+            border-radius: 5px;
+            margin: 10px;
+            cursor: pointer;
+            transition: all 0.3s ease;
+            border: none;
+        }
+        .btn:hover {
+            background-color: #45a049;
+            transform: translateY(-2px);
+            box-shadow: 0 4px 15px rgba(0,0,0,0.1);
+        }
+        .btn:active {
+            transform: translateY(0);
+        }
+        .btn.secondary {
+            background-color: #2196F3;
+        }
+        .btn.secondary:hover {
+            background-color: #0b7dda;
+        }
+        .file-info {
+            color: #666;
+            font-size: 14px;
+            margin: 20px 0;
+        }
+        .theme-toggle {
+            position: absolute;
+            top: 20px;
+            right: 20px;
+            background: #333;
+            color: white;
+            border: none;
+            padding: 10px 15px;
+            border-radius: 5px;
+            cursor: pointer;
+            font-size: 14px;
+        }
+        .theme-toggle:hover {
+            background: #555;
+        }
+        /* 深色主题样式 */
+        body.dark-theme {
+            background-color: #121212;
+            color: white;
+        }
+        body.dark-theme .container {
+            background: #1e1e1e;
+            color: white;
+        }
+        body.dark-theme h1 {
+            color: white;
+        }
+        body.dark-theme .file-info {
+            color: #ccc;
+        }
+        body.dark-theme .theme-toggle {
+            background: #ccc;
+            color: #333;
+        }
+        body {
+            font-family: Arial, sans-serif;
+            max-width: 600px;
+            margin: 50px auto;
+            text-align: center;
+            background-color: #f0f0f0;
+        }
+        .container {
+            background: white;
+            padding: 40px;
+            border-radius: 10px;
+            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
+        }
+        h1 {
+            color: #333;
+        }
+        .btn {
+            display: inline-block;
+            background-color: #4CAF50;
+            color: white;
+            padding: 15px 30px;
+            text-decoration: none;
+            font-size: 18px;
+            border-radius: 5px;
+            margin: 10px;
+            cursor: pointer;
+            transition: all 0.3s ease;
+            border: none;
+        }
+        .btn:hover {
+            background-color: #45a049;
+            transform: translateY(-2px);
+            box-shadow: 0 4px 15px rgba(0,0,0,0.1);
+        }
+        .btn:active {
+            transform: translateY(0);
+        }
+        .btn.secondary {
+            background-color: #2196F3;
+        }
+        .btn.secondary:hover {
+            background-color: #0b7dda;
+        }
+        .file-info {
+            color: #666;
+            font-size: 14px;
+            margin: 20px 0;
+        }
+        .theme-toggle {
+            position: absolute;
+            top: 20px;
+            right: 20px;
+            background: #333;
+            color: white;
+            border: none;
+            padding: 10px 15px;
+            border-radius: 5px;
+            cursor: pointer;
+            font-size: 14px;
+        }
+        .theme-toggle:hover {
+            background: #555;
+        }
+        /* 深色主题样式 */
+        body.dark-theme {
+            background-color: #121212;
+            color: white;
+        }
+        body.dark-theme .container {
+            background: #1e1e1e;
+            color: white;
+        }
+        body.dark-theme h1 {
+            color: white;
+        }
+        body.dark-theme .file-info {
+            color: #ccc;
+        }
+        body.dark-theme .theme-toggle {
+            background: #ccc;
+            color: #333;
+        }
+    </style>
+</head>
+<body>
+    <button class="theme-toggle" onclick="toggleTheme()">切换主题</button>
+
+    <div class="container">
+        <h1>文件服务</h1>
+        <p>选择您需要的操作：</p>
+        <a href="/download_page" class="btn">下载文件</a>
+        <a href="/upload" class="btn secondary">上传文件</a>
+    </div>
+
+    <script>
+        // 主题切换功能
+        function toggleTheme() {
+            document.body.classList.toggle('dark-theme');
+            // 保存主题设置
+            const isDark = document.body.classList.contains('dark-theme');
+            localStorage.setItem('darkTheme', isDark);
+        }
+
+        // 恢复主题设置
+        if (localStorage.getItem('darkTheme') === 'true') {
+            document.body.classList.add('dark-theme');
+        }
+
+        // 页面加载动画
+        window.addEventListener('load', function() {
+            const container = document.querySelector('.container');
+            container.style.opacity = '0';
+            container.style.transform = 'translateY(20px)';
+
+            setTimeout(() => {
+                container.style.transition = 'all 0.5s ease';
+                container.style.opacity = '1';
+                container.style.transform = 'translateY(0)';
+            }, 100);
+        });
+    </script>
+</body>
+</html>
+'''
+
+# 上传页面
+UPLOAD_PAGE_HTML = '''
+<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>文件上传</title>
+    <style>
+        body {
+            font-family: Arial, sans-serif;
+            max-width: 600px;
+            margin: 50px auto;
+            text-align: center;
+            background-color: #f0f0f0;
+        }
+        .container {
+            background: white;
+            padding: 40px;
+            border-radius: 10px;
+            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
+        }
+        h1 {
+            color: #333;
+        }
+        .btn {
+            display: inline-block;
+            background-color: #4CAF50;
+            color: white;
+            padding: 15px 30px;
+            text-decoration: none;
+            font-size: 18px;
+            border-radius: 5px;
+            margin: 10px;
+            cursor: pointer;
+            transition: all 0.3s ease;
+            border: none;
+        }
+        .btn:hover {
+            background-color: #45a049;
+            transform: translateY(-2px);
+            box-shadow: 0 4px 15px rgba(0,0,0,0.1);
+        }
+        .btn:active {
+            transform: translateY(0);
+        }
+        .btn.secondary {
+            background-color: #6c757d;
+            padding: 10px 20px;
+            font-size: 16px;
+        }
+        .btn.secondary:hover {
+            background-color: #5a6268;
+        }
+        .btn:disabled {
+            background-color: #ccc;
+            cursor: not-allowed;
+            transform: none;
+            box-shadow: none;
+        }
+        .file-input {
+            margin: 20px 0;
+            padding: 10px;
+            border: 2px dashed #ccc;
+            border-radius: 5px;
+            background: #f8f9fa;
+        }
+        .file-input input[type="file"] {
+            margin: 10px 0;
+            font-size: 16px;
+        }
+        .success {
+            color: #28a745;
+            margin: 20px 0;
+            padding: 15px;
+            background: #d4edda;
+            border-radius: 5px;
+        }
+        .error {
+            color: #dc3545;
+            margin: 20px 0;
+            padding: 15px;
+            background: #f8d7da;
+            border-radius: 5px;
+        }
+        .theme-toggle {
+            position: absolute;
+            top: 20px;
+            right: 20px;
+            background: #333;
+            color: white;
+            border: none;
+            padding: 10px 15px;
+            border-radius: 5px;
+            cursor: pointer;
+            font-size: 14px;
+        }
+        .theme-toggle:hover {
+            background: #555;
+        }
+        /* 进度条样式 */
+        .progress-container {
+            margin: 20px 0;
+            display: none;
+        }
+        .progress-bar {
+            width: 100%;
+            height: 20px;
+            background-color: #e0e0e0;
+            border-radius: 10px;
+            overflow: hidden;
+            margin: 10px 0;
+        }
+        .progress-fill {
+            height: 100%;
+            background-color: #4CAF50;
+            width: 0%;
+            transition: width 0.3s ease;
+            border-radius: 10px;
+        }
+        .progress-info {
+            font-size: 14px;
+            color: #666;
+            margin: 10px 0;
+            line-height: 1.5;
+        }
+        .progress-details {
+            display: flex;
+            justify-content: space-between;
+            margin-top: 10px;
+            font-size: 12px;
+            color: #888;
+        }
+        /* 深色主题样式 */
+        body.dark-theme {
+            background-color: #121212;
+            color: white;
+        }
+        body.dark-theme .container {
+            background: #1e1e1e;
+            color: white;
+        }
+        body.dark-theme h1 {
+            color: white;
+        }
+        body.dark-theme .file-input {
+            background: #2d2d2d;
+            border-color: #555;
+            color: white;
+        }
+        body.dark-theme .success {
+            background: #155724;
+            color: #d4edda;
+        }
+        body.dark-theme .error {
+            background: #721c24;
+            color: #f8d7da;
+        }
+        body.dark-theme .theme-toggle {
+            background: #ccc;
+            color: #333;
+        }
+        body.dark-theme .progress-bar {
+            background-color: #333;
+        }
+        body.dark-theme .progress-info {
+            color: #ccc;
+        }
+        body.dark-theme .progress-details {
+            color: #aaa;
+        }
+    </style>
+</head>
+<body>
+    <button class="theme-toggle" onclick="toggleTheme()">切换主题</button>
+
+    <div class="container">
+        <h1>文件上传</h1>
+        <p>请选择要上传的文件：</p>
+
+        <form id="uploadForm" enctype="multipart/form-data">
+            <div class="file-input">
+                <input type="file" id="fileInput" name="file" required multiple>
+            </div>
+            <button type="submit" class="btn" id="uploadBtn">上传文件</button>
+        </form>
+
+        <!-- 进度条 -->
+        <div class="progress-container" id="progressContainer">
+            <div class="progress-info" id="progressInfo">准备上传...</div>
+            <div class="progress-bar">
+                <div class="progress-fill" id="progressFill"></div>
+            </div>
+            <div class="progress-details">
+                <span id="speed">网速: 0 B/s</span>
+                <span id="timeElapsed">已用时间: 00:00</span>
+                <span id="timeRemaining">剩余时间: --:--</span>
+            </div>
+        </div>
+
+        <a href="/" class="btn secondary">返回首页</a>
+    </div>
+
+    <script>
+        // 主题切换功能
+        function toggleTheme() {
+            document.body.classList.toggle('dark-theme');
+            // 保存主题设置
+            const isDark = document.body.classList.contains('dark-theme');
+            localStorage.setItem('darkTheme', isDark);
+        }
+
+        // 恢复主题设置
+        if (localStorage.getItem('darkTheme') === 'true') {
+            document.body.classList.add('dark-theme');
+        }
+
+        // 页面加载动画
+        window.addEventListener('load', function() {
+            const container = document.querySelector('.container');
+            container.style.opacity = '0';
+            container.style.transform = 'translateY(20px)';
+
+            setTimeout(() => {
+                container.style.transition = 'all 0.5s ease';
+                container.style.opacity = '1';
+                container.style.transform = 'translateY(0)';
+            }, 100);
+        });
+
+        // 分块上传参数：每块大小与同时在途的块数
+        const CHUNK_SIZE = 8 * 1024 * 1024;
+        const PARALLEL_CHUNKS = 4;
+
+        // 发送请求，返回Promise；失败时reject带上状态码
+        function request(method, url, headers, body, onProgress) {
+            return new Promise(function(resolve, reject) {
+                const xhr = new XMLHttpRequest();
+                xhr.open(method, url, true);
+                for (const name in headers) {
+                    xhr.setRequestHeader(name, headers[name]);
+                }
+                if (onProgress) {
+                    xhr.upload.addEventListener('progress', function(e) {
+                        onProgress(e.loaded);
+                    });
+                }
+                xhr.addEventListener('load', function() {
+                    if (xhr.status >= 200 && xhr.status < 300) {
+                        resolve(xhr);
+                    } else {
+                        reject({status: xhr.status, statusText: xhr.statusText});
+                    }
+                });
+                xhr.addEventListener('error', function() {
+                    reject({status: 0, statusText: '网络错误'});
+                });
+                xhr.send(body === undefined ? null : body);
+            });
+        }
+
+        function sleep(ms) {
+            return new Promise(resolve => setTimeout(resolve, ms));
+        }
+
+        // 文件名按tus的Upload-Metadata格式编码为base64
+        function encodeMetadata(value) {
+            const bytes = new TextEncoder().encode(value);
+            let binary = '';
+            bytes.forEach(b => binary += String.fromCharCode(b));
+            return btoa(binary);
+        }
+
+        // 创建上传会话；同一文件之前未完成的会话会被继续使用
+        async function openSession(file) {
+            const key = 'upload:' + file.name + ':' + file.size + ':' + file.lastModified;
+            const saved = localStorage.getItem(key);
+            if (saved) {
+                try {
+                    const xhr = await request('HEAD', saved, {});
+                    return {url: saved, key: key, offset: parseInt(xhr.getResponseHeader('Upload-Offset'), 10)};
+                } catch (e) {
+                    localStorage.removeItem(key);
+                }
+            }
+            const xhr = await request('POST', '/upload/sessions', {
+                'Upload-Length': String(file.size),
+                'Upload-Metadata': 'filename ' + encodeMetadata(file.name)
+            });
+            const url = xhr.getResponseHeader('Location');
+            if (xhr.getResponseHeader('Upload-Complete') !== '1') {
+                localStorage.setItem(key, url);
+            }
+            return {url: url, key: key, offset: 0};
+        }
+
+        // 上传单个文件：多个数据块同时在途，失败的块按指数退避重试，已确认的块不会重发
+        async function uploadFile(file, progress) {
+            const session = await openSession(file);
+            progress.done += session.offset;
+            progress.update();
+            let next = session.offset;
+
+            async function worker() {
+                while (next < file.size) {
+                    const start = next;
+                    const end = Math.min(start + CHUNK_SIZE, file.size);
+                    next = end;
+                    let attempt = 0;
+                    while (true) {
+                        try {
+                            await request('PATCH', session.url, {
+                                'Upload-Offset': String(start),
+                                'Content-Type': 'application/offset+octet-stream'
+                            }, file.slice(start, end), function(loaded) {
+                                progress.inflight[start] = loaded;
+                                progress.update();
+                            });
+                            break;
+                        } catch (e) {
+                            delete progress.inflight[start];
+                            // 客户端错误（会话不存在等）不再重试
+                            if (e.status >= 400 && e.status < 500 && e.status !== 408 && e.status !== 429) {
+                                localStorage.removeItem(session.key);
+                                throw e;
+                            }
+                            attempt++;
+                            progress.retrying(attempt);
+                            await sleep(Math.min(30000, 1000 * Math.pow(2, attempt)));
+                        }
+                    }
+                    delete progress.inflight[start];
+                    progress.done += end - start;
+                    progress.update();
+                }
+            }
+
+            const workers = [];
+            for (let i = 0; i < PARALLEL_CHUNKS; i++) {
+                workers.push(worker());
+            }
+            await Promise.all(workers);
+            localStorage.removeItem(session.key);
+        }
+
+        // 文件上传进度功能
+        document.getElementById('uploadForm').addEventListener('submit', async function(e) {
+            e.preventDefault();
+
+            const fileInput = document.getElementById('fileInput');
+            const files = fileInput.files;
+            if (files.length === 0) {
+                alert('请选择要上传的文件');
+                return;
+            }
+
+            // 显示进度条
+            const progressContainer = document.getElementById('progressContainer');
+            const progressFill = document.getElementById('progressFill');
+            const progressInfo = document.getElementById('progressInfo');
+            const speedElement = document.getElementById('speed');
+            const timeElapsedElement = document.getElementById('timeElapsed');
+            const timeRemainingElement = document.getElementById('timeRemaining');
+            const uploadBtn = document.getElementById('uploadBtn');
+
+            progressContainer.style.display = 'block';
+            uploadBtn.disabled = true;
+            uploadBtn.textContent = '上传中...';
+
+            let total = 0;
+            for (let i = 0; i < files.length; i++) {
+                total += files[i].size;
+            }
+
+            // 初始化进度跟踪变量
+            let startTime = Date.now();
+            let lastUpdateTime = startTime;
+            let lastLoaded = 0;
+
+            const progress = {
+                done: 0,
+                inflight: {},
+                update: function() {
+                    const now = Date.now();
+                    const elapsed = now - startTime;
+                    const sinceLastUpdate = now - lastUpdateTime;
+                    if (sinceLastUpdate < 200) {
+                        return;
+                    }
+
+                    let loaded = this.done;
+                    for (const start in this.inflight) {
+                        loaded += this.inflight[start];
+                    }
+                    loaded = Math.min(loaded, total);
+                    const percent = total ? Math.round((loaded / total) * 100) : 100;
+
+                    // 计算网速
+                    const bytesSinceLastUpdate = loaded - lastLoaded;
+                    const speedBps = Math.max(0, bytesSinceLastUpdate / (sinceLastUpdate / 1000));
+
+                    // 更新进度条
+                    progressFill.style.width = percent + '%';
+                    progressInfo.textContent = `上传进度: ${percent}% (${formatFileSize(loaded)} / ${formatFileSize(total)})`;
+
+                    // 更新网速
+                    speedElement.textContent = `网速: ${formatSpeed(speedBps)}`;
+
+                    // 更新已用时间
+                    timeElapsedElement.textContent = `已用时间: ${formatTime(elapsed)}`;
+
+                    // 计算并更新剩余时间
+                    if (percent > 0 && percent < 100) {
+                        const estimatedTotalTime = (elapsed / percent) * 100;
+                        const remainingTime = estimatedTotalTime - elapsed;
+                        timeRemainingElement.textContent = `剩余时间: ${formatTime(remainingTime)}`;
+                    } else {
+                        timeRemainingElement.textContent = `剩余时间: --:--`;
+                    }
+
+                    // 更新最后更新时间和已加载字节数
+                    lastUpdateTime = now;
+                    lastLoaded = loaded;
+                },
+                retrying: function(attempt) {
+                    progressInfo.textContent = `网络中断，正在重试（第 ${attempt} 次）...`;
+                }
+            };
+
+            try {
+                for (let i = 0; i < files.length; i++) {
+                    await uploadFile(files[i], progress);
+                }
+                // 上传成功，显示结果
+                window.location.href = '/upload/success?count=' + files.length;
+            } catch (err) {
+                progressInfo.textContent = `上传失败: ${err.statusText || err}`;
+                uploadBtn.disabled = false;
+                uploadBtn.textContent = '上传文件';
+            }
+        });
+
+        // 格式化文件大小
+        function formatFileSize(bytes) {
+            if (bytes === 0) return '0 B';
+            const k = 1024;
+            const sizes = ['B', 'KB', 'MB', 'GB'];
+            const i = Math.floor(Math.log(bytes) / Math.log(k));
+            return parseFloat((bytes / Math.pow(k, i)).toFixed(2)) + ' ' + sizes[i];
+        }
+
+        // 格式化网速
+        function formatSpeed(bps) {
+            if (bps < 1024) return bps.toFixed(0) + ' B/s';
+            if (bps < 1024 * 1024) return (bps / 1024).toFixed(2) + ' KB/s';
+            return (bps / (1024 * 1024)).toFixed(2) + ' MB/s';
+        }
+
+        // 格式化时间（毫秒转为 mm:ss）
+        function formatTime(ms) {
+            const totalSeconds = Math.floor(ms / 1000);
+            const minutes = Math.floor(totalSeconds / 60);
+            const seconds = totalSeconds % 60;
+            return `${minutes.toString().padStart(2, '0')}:${seconds.toString().padStart(2, '0')}`;
+        }
+    </script>
+</body>
+</html>
+'''
+
+
+# 下载页面，{{file_list}}、{{pager}}、{{next_cursor}} 在请求时替换
+DOWNLOAD_PAGE_HTML = '''
+<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>文件下载</title>
+    <style>
+        body {
+            font-family: Arial, sans-serif;
+            max-width: 800px;
+            margin: 50px auto;
+            text-align: center;
+            background-color: #f0f0f0;
+        }
+        .container {
+            background: white;
+            padding: 40px;
+            border-radius: 10px;
+            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
+        }
+        h1 {
+            color: #333;
+            margin-bottom: 30px;
+        }
+        .btn {
+            display: inline-block;
+            background-color: #4CAF50;
+            color: white;
+            padding: 15px 30px;
+            text-decoration: none;
+            font-size: 18px;
+            border-radius: 5px;
+            margin: 10px;
+            cursor: pointer;
+            transition: all 0.3s ease;
+            border: none;
+        }
+        .btn:hover {
+            background-color: #45a049;
+            transform: translateY(-2px);
+            box-shadow: 0 4px 15px rgba(0,0,0,0.1);
+        }
+        .btn:active {
+            transform: translateY(0);
+        }
+        .btn.secondary {
+            background-color: #6c757d;
+            padding: 10px 20px;
+            font-size: 16px;
+        }
+        .btn-small {
+            background-color: #4CAF50;
+            color: white;
+            padding: 8px 15px;
+            text-decoration: none;
+            font-size: 14px;
+            border-radius: 3px;
+        }
+        .btn-small:hover {
+            background-color: #45a049;
+        }
+        .theme-toggle {
+            position: absolute;
+            top: 20px;
+            right: 20px;
+            background: #333;
+            color: white;
+            border: none;
+            padding: 10px 15px;
+            border-radius: 5px;
+            cursor: pointer;
+            font-size: 14px;
+        }
+        .theme-toggle:hover {
+            background: #555;
+        }
+        /* 文件列表样式 */
+        .file-list {
+            width: 100%;
+            border-collapse: collapse;
+            margin: 20px 0;
+        }
+        .file-list th,
+        .file-list td {
+            padding: 12px;
+            text-align: left;
+            border-bottom: 1px solid #ddd;
+        }
+        .file-list th {
+            background-color: #f2f2f2;
+            font-weight: bold;
+        }
+        .file-list tr:hover {
+            background-color: #f5f5f5;
+        }
+        .pager {
+            margin: 10px 0 20px;
+            color: #666;
+        }
+        .pager a {
+            margin: 0 10px;
+            color: #2196F3;
+        }
+        /* 深色主题样式 */
+        body.dark-theme {
+            background-color: #121212;
+            color: white;
+        }
+        body.dark-theme .container {
+            background: #1e1e1e;
+            color: white;
+        }
+        body.dark-theme h1 {
+            color: white;
+        }
+        body.dark-theme .file-list th {
+            background-color: #2d2d2d;
+            color: white;
+        }
+        body.dark-theme .file-list td {
+            border-bottom: 1px solid #444;
+            color: white;
+        }
+        body.dark-theme .file-list tr:hover {
+            background-color: #2d2d2d;
+        }
+        body.dark-theme .theme-toggle {
+            background: #ccc;
+            color: #333;
+        }
+    </style>
+</head>
+<body>
+    <button class="theme-toggle" onclick="toggleTheme()">切换主题</button>
+
+    <div class="container">
+        <h1>文件下载</h1>
+        <p>以下是可供下载的文件列表：</p>
+
+        <table class="file-list">
+            <thead>
+                <tr>
+                    <th>文件名</th>
+                    <th>文件大小</th>
+                    <th>操作</th>
+                </tr>
+            </thead>
+            <tbody id="fileRows">
+                {{file_list}}
+            </tbody>
+        </table>
+
+        <div class="pager">{{pager}}</div>
+        <button class="btn secondary" id="loadMore" data-cursor="{{next_cursor}}" style="display: none;">加载更多</button>
+
+        <a href="/" class="btn secondary">返回首页</a>
+    </div>
+
+    <script>
+        // 主题切换功能
+        function toggleTheme() {
+            document.body.classList.toggle('dark-theme');
+            // 保存主题设置
+            const isDark = document.body.classList.contains('dark-theme');
+            localStorage.setItem('darkTheme', isDark);
+        }
+
+        // 恢复主题设置
+        if (localStorage.getItem('darkTheme') === 'true') {
+            document.body.classList.add('dark-theme');
+        }
+
+        // 页面加载动画
+        window.addEventListener('load', function() {
+            const container = document.querySelector('.container');
+            container.style.opacity = '0';
+            container.style.transform = 'translateY(20px)';
+
+            setTimeout(() => {
+                container.style.transition = 'all 0.5s ease';
+                container.style.opacity = '1';
+                container.style.transform = 'translateY(0)';
+            }, 100);
+        });
+
+        // 通过 /api/files 按游标继续加载文件，无需刷新整个页面
+        const loadMoreBtn = document.getElementById('loadMore');
+
+        function formatSize(bytes) {
+            const units = ['B', 'KB', 'MB', 'GB'];
+            for (const unit of units) {
+                if (bytes < 1024) return bytes.toFixed(2) + ' ' + unit;
+                bytes /= 1024;
+            }
+            return bytes.toFixed(2) + ' TB';
+        }
+
+        function appendRow(file) {
+            const row = document.createElement('tr');
+            const nameCell = document.createElement('td');
+            nameCell.textContent = file.name;
+            const sizeCell = document.createElement('td');
+            sizeCell.textContent = formatSize(file.size);
+            const actionCell = document.createElement('td');
+            const link = document.createElement('a');
+            link.href = '/download?file=' + encodeURIComponent(file.name);
+            link.className = 'btn-small';
+            link.textContent = '下载';
+            actionCell.appendChild(link);
+            row.append(nameCell, sizeCell, actionCell);
+            document.getElementById('fileRows').appendChild(row);
+        }
+
+        if (loadMoreBtn.dataset.cursor) {
+            // 有脚本时用“加载更多”代替翻页链接
+            loadMoreBtn.style.display = 'inline-block';
+            document.querySelectorAll('.pager a').forEach(a => a.style.display = 'none');
+        }
+
+        loadMoreBtn.addEventListener('click', async function() {
+            loadMoreBtn.disabled = true;
+            try {
+                const response = await fetch('/api/files?limit=500&cursor=' + encodeURIComponent(loadMoreBtn.dataset.cursor));
+                const data = await response.json();
+                data.files.forEach(appendRow);
+                if (data.next_cursor) {
+                    loadMoreBtn.dataset.cursor = data.next_cursor;
+                } else {
+                    loadMoreBtn.style.display = 'none';
+                }
+            } finally {
+                loadMoreBtn.disabled = false;
+            }
+        });
+    </script>
+</body>
+</html>
+'''
+
+# 上传成功页面，使用普通字符串并手动替换变量，避免CSS大括号与f-string冲突
+UPLOAD_SUCCESS_HTML = '''
+<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>上传成功</title>
+    <style>
+        body {
+            font-family: Arial, sans-serif;
+            max-width: 600px;
+            margin: 50px auto;
+            text-align: center;
+            background-color: #f0f0f0;
+        }
+        .container {
+            background: white;
+            padding: 20px;
+            border-radius: 5px;
+            box-shadow: 0 1px 3px rgba(0,0,0,0.1);
+        }
+        h1 {
+            color: #333;
+        }
+        .btn {
+            display: inline-block;
+            background-color: #4CAF50;
+            color: white;
+            padding: 10px 20px;
+            text-decoration: none;
+            font-size: 16px;
+            border-radius: 3px;
+            margin: 10px;
+            cursor: pointer;
+            border: none;
+        }
+        .btn:hover {
+            background-color: #45a049;
+        }
+        .btn.secondary {
+            background-color: #6c757d;
+        }
+        .success {
+            color: #28a745;
+            margin: 20px 0;
+            padding: 10px;
+            background: #d4edda;
+            border-radius: 3px;
+        }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>上传成功</h1>
+        <div class="success">
+            <p>成功上传 {{success_count}} 个文件</p>
+        </div>
+        <a href="/upload" class="btn">继续上传</a>
+        <a href="/" class="btn secondary">返回首页</a>
+    </div>
+</body>
+</html>
+'''
+
+
+def render_download_page(file_index, query):
+    # 根据查询参数中的页码渲染下载页面
+    try:
+        page = max(int(query.get('page', ['1'])[0]), 1)
+    except ValueError:
+        page = 1
+    page_count = max((len(file_index) + DOWNLOAD_PAGE_SIZE - 1) // DOWNLOAD_PAGE_SIZE, 1)
+    page = min(page, page_count)
+    total, entries = file_index.page((page - 1) * DOWNLOAD_PAGE_SIZE, DOWNLOAD_PAGE_SIZE)
+
+    # 分页导航
+    pager = [f'<span>共 {total} 个文件，第 {page}/{page_count} 页</span>']
+    if page > 1:
+        pager.insert(0, f'<a href="/download_page?page={page - 1}">上一页</a>')
+    if page < page_count:
+        pager.append(f'<a href="/download_page?page={page + 1}">下一页</a>')
+
+    # 页面末尾之后的游标，供“加载更多”通过 /api/files 继续读取
+    next_cursor = encode_cursor('name', entries[-1][0]) if page < page_count else ''
+
+    # 文件列表最后替换，避免文件名中恰好包含占位符
+    html = DOWNLOAD_PAGE_HTML.replace('{{pager}}', ' '.join(pager))
+    html = html.replace('{{next_cursor}}', next_cursor)
+    return html.replace('{{file_list}}', render_file_rows(entries))
+
+
+def render_upload_success(success_count):
+    return UPLOAD_SUCCESS_HTML.replace('{{success_count}}', str(success_count))
+
+
+class PooledTCPServer(socketserver.TCPServer):
+    """
+    固定大小线程池的TCP服务器
+    accept到的连接放入有界队列由工作线程处理；
+    线程池和队列都满时立即返回503和Retry-After，而不是无限制地创建线程
+    """
+
+    daemon_threads = True
+
+    def __init__(self, server_address, handler_class, threads, backlog=128, queue_size=256, retry_after=5):
+        # listen()使用request_queue_size作为accept队列长度，需要在父类初始化前设置
+        self.request_queue_size = backlog
+        self.threads = threads
+        self.retry_after = retry_after
+        self.pending = queue.Queue(maxsize=queue_size)
+        self.busy_workers = 0
+        self.rejected = 0
+        self.busy_lock = threading.Lock()
+        super().__init__(server_address, handler_class)
+        self.workers = []
+        for i in range(threads):
+            worker = threading.Thread(target=self._worker, name=f"worker-{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def _worker(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            request, client_address = item
+            with self.busy_lock:
+                self.busy_workers += 1
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+                with self.busy_lock:
+                    self.busy_workers -= 1
+
+    def process_request(self, request, client_address):
+        try:
+            self.pending.put_nowait((request, client_address))
+        except queue.Full:
+            self.rejected += 1
+            self.reject_request(request)
+
+    def reject_request(self, request):
+        # 在accept线程中快速拒绝，不能因为慢客户端阻塞，所以全程非阻塞
+        body = b"Server busy, please retry later.\n"
+        response = (
+            "HTTP/1.1 503 Service Unavailable\r\n"
+            f"Retry-After: {self.retry_after}\r\n"
+            "Content-Type: text/plain; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n"
+        ).encode('latin-1') + body
+        try:
+            request.setblocking(False)
+            # 先读掉已经到达的请求数据，避免close时内核发送RST导致客户端收不到503
+            try:
+                request.recv(65536)
+            except OSError:
+                pass
+            request.send(response)
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        for _ in self.workers:
+            self.pending.put(None)
+
+
+class AsyncMultipartReader(MultipartReader):
+    """
+    MultipartReader的asyncio版本
+    从asyncio.StreamReader按块读取，解析逻辑与同步版本相同，part内容为异步迭代器
+    """
+
+    async def _fill(self):
+        if self.remaining <= 0:
+            return False
+        data = await self.rfile.read(min(self.chunk_size, self.remaining))
+        if not data:
+            raise MultipartError("请求体提前结束")
+        self.remaining -= len(data)
+        self.buffer += data
+        return True
+
+    async def _drain(self):
+        self.buffer.clear()
+        while self.remaining > 0:
+            data = await self.rfile.read(min(self.chunk_size, self.remaining))
+            if not data:
+                break
+            self.remaining -= len(data)
+
+    async def _read_until(self, marker, limit):
+        while True:
+            pos = self.buffer.find(marker)
+            if pos != -1:
+                data = bytes(self.buffer[:pos])
+                del self.buffer[:pos + len(marker)]
+                return data
+            if len(self.buffer) > limit:
+                raise MultipartError("part头部过长")
+            if not await self._fill():
+                raise MultipartError("multipart格式错误")
+
+    async def _after_boundary(self):
+        while len(self.buffer) < 2:
+            if not await self._fill():
+                raise MultipartError("multipart格式错误")
+        if self.buffer[:2] == b'--':
+            self.finished = True
+            await self._drain()
+            return False
+        await self._read_until(b'\r\n', MAX_PART_HEADER_SIZE)
+        return True
+
+    async def _iter_body(self):
+        keep = len(self.delimiter) - 1
+        while True:
+            pos = self.buffer.find(self.delimiter)
+            if pos != -1:
+                if pos:
+                    yield bytes(self.buffer[:pos])
+                del self.buffer[:pos + len(self.delimiter)]
+                return
+            if len(self.buffer) > keep:
+                cut = len(self.buffer) - keep
+                yield bytes(self.buffer[:cut])
+                del self.buffer[:cut]
+            if not await self._fill():
+                raise MultipartError("请求体提前结束")
+
+    async def parts(self):
+        await self._read_until(self.boundary, len(self.boundary) + MAX_PART_HEADER_SIZE)
+        while await self._after_boundary():
+            headers = await self._read_until(b'\r\n\r\n', MAX_PART_HEADER_SIZE)
+            body = self._iter_body()
+            yield headers.decode('utf-8', 'replace'), body
+            async for _ in body:
+                pass
+
+
+class AsyncRequest:
+    """asyncio引擎中的一个HTTP请求，属性命名与BaseHTTPRequestHandler保持一致"""
+
+    def __init__(self, reader, writer, requestline, command, path, headers):
+        self.reader = reader
+        self.writer = writer
+        self.requestline = requestline
+        self.command = command
+        self.path = path
+        self.headers = headers
+        self.client_address = writer.get_extra_info('peername') or ('-', 0)
+
+
+class AsyncFileServer:
+    """
+    基于asyncio streams的服务器引擎（--engine asyncio）
+    路由与行为与MyHandler一致；下载通过loop.sendfile交给内核完成，
+    上传边接收边写盘（磁盘写入放到线程池中），单进程即可同时保持大量慢速连接
+    """
+
+    server_version = "AsyncFileServer/1.0"
+
+    def __init__(self, file_index, upload_sessions, static_pages):
+        self.file_index = file_index
+        self.upload_sessions = upload_sessions
+        self.static_pages = static_pages
+
+    async def serve(self, host, port, backlog=128):
+        server = await asyncio.start_server(self.handle_connection, host, port, backlog=backlog)
+        async with server:
+            await server.serve_forever()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            request = await self.read_request(reader, writer)
+            if request is not None:
+                await self.dispatch(request)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            print(f"处理请求时出错: {e}")
+        finally:
+            writer.close()
+
+    async def read_request(self, reader, writer):
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError:
+            await self.send_error_to(writer, 431, None)
+            return None
+        lines = head.decode('latin-1').split('\r\n')
+        requestline = lines[0]
+        words = requestline.split()
+        if len(words) != 3 or not words[2].startswith('HTTP/'):
+            await self.send_error_to(writer, 400, None, f"Bad request syntax ({requestline!r})")
+            return None
+        headers = email.parser.Parser(_class=http.client.HTTPMessage).parsestr('\r\n'.join(lines[1:]))
+        return AsyncRequest(reader, writer, requestline, words[0], words[1], headers)
+
+    def log(self, request, status):
+        now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        host, port = request.client_address[:2]
+        print(f'[{now}] {host}:{port} - "{request.requestline}" {status} -')
+
+    def start_response(self, request, status, headers):
+        self.log(request, status)
+        self.write_head(request.writer, status, headers)
+
+    def write_head(self, writer, status, headers):
+        try:
+            reason = http.HTTPStatus(status).phrase
+        except ValueError:
+            reason = ''
+        lines = [f"HTTP/1.0 {status} {reason}",
+                 f"Server: {self.server_version}",
+                 f"Date: {http_date(time.time())}"]
+        lines.extend(f"{name}: {value}" for name, value in headers)
+        lines.append("Connection: close")
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+
+    async def send_error_to(self, writer, code, message, explain=None):
+        try:
+            short, long = http.HTTPStatus(code).phrase, http.HTTPStatus(code).description
+        except ValueError:
+            short, long = '???', '???'
+        body = (http.server.DEFAULT_ERROR_MESSAGE % {
+            'code': code,
+            'message': html_escape(message or short, quote=False),
+            'explain': html_escape(explain or long, quote=False),
+        }).encode('UTF-8', 'replace')
+        self.write_head(writer, code, [
+            ("Content-Type", http.server.DEFAULT_ERROR_CONTENT_TYPE),
+            ("Content-Length", str(len(body))),
+        ])
+        writer.write(body)
+        await writer.drain()
+
+    async def send_error(self, request, code, message=None, explain=None):
+        self.log(request, code)
+        await self.send_error_to(request.writer, code, message, explain)
+
+    async def send_body(self, request, status, headers, body):
+        self.start_response(request, status, headers)
+        if body and request.command != 'HEAD':
+            request.writer.write(body)
+        await request.writer.drain()
+
+    async def send_html(self, request, html, status=200):
+        body = html.encode('utf-8')
+        await self.send_body(request, status, [
+            ("Content-type", "text/html; charset=utf-8"),
+            ("Content-Length", str(len(body))),
+        ], body)
+
+    async def send_json(self, request, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        await self.send_body(request, status, [
+            ("Content-type", "application/json; charset=utf-8"),
+            ("Content-Length", str(len(body))),
+            ("Cache-Control", "no-cache"),
+        ], body)
+
+    async def dispatch(self, request):
+        path = request.path
+        command = request.command
+        if command == 'GET':
+            if path in self.static_pages:
+                await self.send_body(request, *self.static_pages[path].respond(request.headers))
+            elif path == "/api/files" or path.startswith("/api/files?"):
+                query = urllib.parse.parse_qs(urllib.parse.urlparse(path).query)
+                await self.send_json(request, *api_files(self.file_index, query))
+            elif path == "/download_page" or path.startswith("/download_page?"):
+                query = urllib.parse.parse_qs(urllib.parse.urlparse(path).query)
+                await self.send_html(request, render_download_page(self.file_index, query))
+            elif path.startswith("/download"):
+                await self.handle_download(request)
+            elif path.startswith("/upload/success"):
+                query = urllib.parse.parse_qs(urllib.parse.urlparse(path).query)
+                try:
+                    success_count = int(query.get('count', ['0'])[0])
+                except ValueError:
+                    success_count = 0
+                await self.send_html(request, render_upload_success(success_count))
+            else:
+                await self.send_error(request, 404, "Not Found")
+        elif command == 'HEAD':
+            if path.startswith("/upload/sessions/"):
+                await self.handle_upload_session(request)
+            elif path in self.static_pages:
+                await self.send_body(request, *self.static_pages[path].respond(request.headers))
+            else:
+                await self.send_error(request, 404, "Not Found")
+        elif command == 'POST':
+            if path == "/upload/sessions":
+                await self.handle_upload_session(request)
+            elif path == "/upload":
+                await self.handle_upload(request)
+            else:
+                await self.send_error(request, 404, "Not Found")
+        elif command in ('PATCH', 'DELETE'):
+            if path.startswith("/upload/sessions/"):
+                await self.handle_upload_session(request)
+            else:
+                await self.send_error(request, 404, "Not Found")
+        else:
+            await self.send_error(request, 501, f"Unsupported method ({command!r})")
+
+    async def handle_download(self, request):
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(request.path).query)
+        if 'file' not in query:
+            await self.send_error(request, 400, "Bad Request", "缺少file参数")
+            return
+        filename = query['file'][0]
+        file_path = os.path.join(STORAGE_DIR, filename)
+        if not os.path.isfile(file_path):
+            await self.send_error(request, 404, "File not found", f"File not found: {filename}")
+            return
+
+        loop = asyncio.get_running_loop()
+        writer = request.writer
+        with open(file_path, 'rb') as f:
+            plan = plan_file_response(request.headers, os.fstat(f.fileno()), filename)
+            self.start_response(request, plan.status, plan.headers)
+            for prefix, offset, count in plan.segments:
+                if prefix:
+                    writer.write(prefix)
+                if count <= 0:
+                    continue
+                await writer.drain()
+                if USE_SENDFILE:
+                    # 底层使用os.sendfile，不支持时asyncio自动退回读写拷贝
+                    await loop.sendfile(writer.transport, f, offset, count)
+                else:
+                    f.seek(offset)
+                    remaining = count
+                    while remaining > 0:
+                        chunk = await loop.run_in_executor(None, f.read, min(DOWNLOAD_CHUNK_SIZE, remaining))
+                        if not chunk:
+                            break
+                        writer.write(chunk)
+                        remaining -= len(chunk)
+                        await writer.drain()
+            if plan.trailer:
+                writer.write(plan.trailer)
+            await writer.drain()
+
+    async def handle_upload(self, request):
+        boundary = parse_multipart_boundary(request.headers.get('Content-Type'))
+        if not boundary:
+            await self.send_error(request, 400, "Invalid content type")
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            content_length = int(request.headers['Content-Length'])
+            reader = AsyncMultipartReader(request.reader, boundary, content_length)
+            success_count = 0
+            async for headers, body in reader.parts():
+                filename = parse_part_filename(headers)
+                if not filename:
+                    continue
+                save_path = os.path.join(STORAGE_DIR, filename)
+                with open(save_path, 'wb') as f:
+                    async for chunk in body:
+                        # 磁盘写入在线程池中进行，不阻塞事件循环
+                        await loop.run_in_executor(None, f.write, chunk)
+                self.file_index.update(filename)
+                success_count += 1
+        except MultipartError as e:
+            await self.send_error(request, 400, "Bad Request", str(e))
+            return
+        except (TypeError, ValueError) as e:
+            await self.send_error(request, 400, "Bad Request", str(e))
+            return
+        await self.send_html(request, render_upload_success(success_count))
+
+    async def handle_upload_session(self, request):
+        # 与MyHandler.handle_upload_session相同的可续传上传接口
+        sessions = self.upload_sessions
+        loop = asyncio.get_running_loop()
+        try:
+            if request.command == "POST":
+                meta = sessions.create(*parse_session_create(request.headers))
+                if meta.get('completed'):
+                    self.file_index.update(meta['filename'])
+                await self.send_body(request, 201, upload_session_headers(
+                    meta, sessions.ttl, f"/upload/sessions/{meta['id']}"), b'')
+                return
+
+            upload_id = request.path[len("/upload/sessions/"):].split('?', 1)[0]
+            if request.command == "HEAD":
+                await self.send_body(request, 200, upload_session_headers(sessions.get(upload_id), sessions.ttl), b'')
+            elif request.command == "DELETE":
+                sessions.delete(upload_id)
+                await self.send_body(request, 204, upload_session_headers(), b'')
+            else:
+                offset, count = parse_session_patch(request.headers)
+                fd = sessions.begin_write(upload_id, offset, count)
+                position = offset
+                try:
+                    remaining = count
+                    while remaining > 0:
+                        data = await request.reader.read(min(UPLOAD_CHUNK_SIZE, remaining))
+                        if not data:
+                            break
+                        await loop.run_in_executor(None, os.pwrite, fd, data, position)
+                        position += len(data)
+                        remaining -= len(data)
+                finally:
+                    os.close(fd)
+                meta = await loop.run_in_executor(
+                    None, sessions.end_write, upload_id, offset, position, offset + count)
+                if meta.get('completed'):
+                    self.file_index.update(meta['filename'])
+                await self.send_body(request, 204, upload_session_headers(meta, sessions.ttl), b'')
+        except UploadSessionError as e:
+            await self.send_error(request, e.status, None, str(e))
+
+
 def main():
     # 默认配置
     PORT = 8000
     
     # 解析命令行参数
+    THREADS = 0
+    BACKLOG = 128
+    QUEUE_SIZE = 256
+    RETRY_AFTER = 5
+    ENGINE = "threading"
+    global STORAGE_DIR, USE_SENDFILE
     for i in range(1, len(sys.argv), 2):
         if sys.argv[i] == "--port" and i+1 < len(sys.argv):
             PORT = int(sys.argv[i+1])
+        elif sys.argv[i] == "--storage-dir" and i+1 < len(sys.argv):
+            STORAGE_DIR = sys.argv[i+1]
+        elif sys.argv[i] == "--sendfile" and i+1 < len(sys.argv):
+            USE_SENDFILE = sys.argv[i+1] not in ("off", "0", "false", "no")
+        elif sys.argv[i] == "--threads" and i+1 < len(sys.argv):
+            THREADS = int(sys.argv[i+1])
+        elif sys.argv[i] == "--backlog" and i+1 < len(sys.argv):
+            BACKLOG = int(sys.argv[i+1])
+        elif sys.argv[i] == "--queue-size" and i+1 < len(sys.argv):
+            QUEUE_SIZE = int(sys.argv[i+1])
+        elif sys.argv[i] == "--retry-after" and i+1 < len(sys.argv):
+            RETRY_AFTER = int(sys.argv[i+1])
+        elif sys.argv[i] == "--engine" and i+1 < len(sys.argv):
+            ENGINE = sys.argv[i+1]
+    
+    if ENGINE not in ("threading", "asyncio"):
+        print(f"未知的服务器引擎: {ENGINE}（可选 threading / asyncio）")
+        return
     
     # 文件存储目录已在全局配置
     # 确保存储目录存在
@@ -34,466 +2426,49 @@ def main():
         print(f"已创建存储目录: {STORAGE_DIR}")
     else:
         print(f"使用现有存储目录: {STORAGE_DIR}")
-    
-    # 格式化文件大小
-    def format_size(size_bytes):
-        for unit in ['B', 'KB', 'MB', 'GB']:
-            if size_bytes < 1024.0:
-                return f"{size_bytes:.2f} {unit}"
-            size_bytes /= 1024.0
-        return f"{size_bytes:.2f} TB"
+
+    # 可续传上传会话，重启后从会话目录恢复
+    upload_sessions = UploadSessionStore(os.path.join(STORAGE_DIR, UPLOAD_SESSION_DIR_NAME))
+    upload_sessions.start_cleanup_thread()
+
+    # 静态页面在启动时编码并压缩一次，之后每次请求直接发送字节
+    static_pages = {
+        "/": StaticPage(INDEX_PAGE_HTML),
+        "/upload": StaticPage(UPLOAD_PAGE_HTML),
+    }
+
+    # 文件列表索引，避免每次请求下载页面都遍历整个目录
+    file_index = FileIndex(STORAGE_DIR)
+    file_index.start_watch_thread()
     
     print("=" * 50)
     print("文件服务服务器")
     print("=" * 50)
     print(f"服务端口: {PORT}")
     print(f"存储目录: {STORAGE_DIR}")
+    print(f"下载方式: {'sendfile零拷贝' if USE_SENDFILE and hasattr(os, 'sendfile') else '缓冲拷贝'}")
     print("=" * 50)
     
     # 自定义请求处理器
     class MyHandler(http.server.BaseHTTPRequestHandler):
         def do_GET(self):
             if self.path == "/":
-                # 显示主页面（包含下载和上传链接）
-                self.send_response(200)
-                self.send_header("Content-type", "text/html; charset=utf-8")
-                self.end_headers()
+                # 显示主页面（包含下载和上传链接），使用启动时预先编码好的页面
+                self.send_static_page(static_pages["/"])
                 
-                html = '''
-                <!DOCTYPE html>
-                <html lang="zh-CN">
-                <head>
-                    <meta charset="UTF-8">
-                    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-                    <title>文件服务</title>
-                    <style>
-                        body {
-                            font-family: Arial, sans-serif;
-                            max-width: 600px;
-                            margin: 50px auto;
-                            text-align: center;
-                            background-color: #f0f0f0;
-                        }
-                        .container {
-                            background: white;
-                            padding: 40px;
-                            border-radius: 10px;
-                            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-                        }
-                        h1 {
-                            color: #333;
-                        }
-                        .btn {
-                            display: inline-block;
-                            background-color: #4CAF50;
-                            color: white;
-                            padding: 15px 30px;
-                            text-decoration: none;
-                            font-size: 18px;
-                            border-radius: 5px;
-                            margin: 10px;
-                            cursor: pointer;
-                            transition: all 0.3s ease;
-                            border: none;
-                        }
-                        .btn:hover {
-                            background-color: #45a049;
-                            transform: translateY(-2px);
-                            box-shadow: 0 4px 15px rgba(0,0,0,0.1);
-                        }
-                        .btn:active {
-                            transform: translateY(0);
-                        }
-                        .btn.secondary {
-                            background-color: #2196F3;
-                        }
-                        .btn.secondary:hover {
-                            background-color: #0b7dda;
-                        }
-                        .file-info {
-                            color: #666;
-                            font-size: 14px;
-                            margin: 20px 0;
-                        }
-                        .theme-toggle {
-                            position: absolute;
-                            top: 20px;
-                            right: 20px;
-                            background: #333;
-                            color: white;
-                            border: none;
-                            padding: 10px 15px;
-                            border-radius: 5px;
-                            cursor: pointer;
-                            font-size: 14px;
-                        }
-                        .theme-toggle:hover {
-                            background: #555;
-                        }
-                        /* 深色主题样式 */
-                        body.dark-theme {
-                            background-color: #121212;
-                            color: white;
-                        }
-                        body.dark-theme .container {
-                            background: #1e1e1e;
-                            color: white;
-                        }
-                        body.dark-theme h1 {
-                            color: white;
-                        }
-                        body.dark-theme .file-info {
-                            color: #ccc;
-                        }
-                        body.dark-theme .theme-toggle {
-                            background: #ccc;
-                            color: #333;
-                        }
-                        body {
-                            font-family: Arial, sans-serif;
-                            max-width: 600px;
-                            margin: 50px auto;
-                            text-align: center;
-                            background-color: #f0f0f0;
-                        }
-                        .container {
-                            background: white;
-                            padding: 40px;
-                            border-radius: 10px;
-                            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-                        }
-                        h1 {
-                            color: #333;
-                        }
-                        .btn {
-                            display: inline-block;
-                            background-color: #4CAF50;
-                            color: white;
-                            padding: 15px 30px;
-                            text-decoration: none;
-                            font-size: 18px;
-                            border-radius: 5px;
-                            margin: 10px;
-                            cursor: pointer;
-                            transition: all 0.3s ease;
-                            border: none;
-                        }
-                        .btn:hover {
-                            background-color: #45a049;
-                            transform: translateY(-2px);
-                            box-shadow: 0 4px 15px rgba(0,0,0,0.1);
-                        }
-                        .btn:active {
-                            transform: translateY(0);
-                        }
-                        .btn.secondary {
-                            background-color: #2196F3;
-                        }
-                        .btn.secondary:hover {
-                            background-color: #0b7dda;
-                        }
-                        .file-info {
-                            color: #666;
-                            font-size: 14px;
-                            margin: 20px 0;
-                        }
-                        .theme-toggle {
-                            position: absolute;
-                            top: 20px;
-                            right: 20px;
-                            background: #333;
-                            color: white;
-                            border: none;
-                            padding: 10px 15px;
-                            border-radius: 5px;
-                            cursor: pointer;
-                            font-size: 14px;
-                        }
-                        .theme-toggle:hover {
-                            background: #555;
-                        }
-                        /* 深色主题样式 */
-                        body.dark-theme {
-                            background-color: #121212;
-                            color: white;
-                        }
-                        body.dark-theme .container {
-                            background: #1e1e1e;
-                            color: white;
-                        }
-                        body.dark-theme h1 {
-                            color: white;
-                        }
-                        body.dark-theme .file-info {
-                            color: #ccc;
-                        }
-                        body.dark-theme .theme-toggle {
-                            background: #ccc;
-                            color: #333;
-                        }
-                    </style>
-                </head>
-                <body>
-                    <button class="theme-toggle" onclick="toggleTheme()">切换主题</button>
-                    
-                    <div class="container">
-                        <h1>文件服务</h1>
-                        <p>选择您需要的操作：</p>
-                        <a href="/download_page" class="btn">下载文件</a>
-                        <a href="/upload" class="btn secondary">上传文件</a>
-                    </div>
-                    
-                    <script>
-                        // 主题切换功能
-                        function toggleTheme() {
-                            document.body.classList.toggle('dark-theme');
-                            // 保存主题设置
-                            const isDark = document.body.classList.contains('dark-theme');
-                            localStorage.setItem('darkTheme', isDark);
-                        }
-                        
-                        // 恢复主题设置
-                        if (localStorage.getItem('darkTheme') === 'true') {
-                            document.body.classList.add('dark-theme');
-                        }
-                        
-                        // 页面加载动画
-                        window.addEventListener('load', function() {
-                            const container = document.querySelector('.container');
-                            container.style.opacity = '0';
-                            container.style.transform = 'translateY(20px)';
-                            
-                            setTimeout(() => {
-                                container.style.transition = 'all 0.5s ease';
-                                container.style.opacity = '1';
-                                container.style.transform = 'translateY(0)';
-                            }, 100);
-                        });
-                    </script>
-                </body>
-                </html>
-                '''
-                
-                self.wfile.write(html.encode('utf-8'))
+            elif self.path == "/api/files" or self.path.startswith("/api/files?"):
+                # JSON格式的文件列表，游标分页
+                self.handle_api_files()
                 
-            elif self.path == "/download_page":
-                # 显示下载页面，列出所有文件
-                self.send_response(200)
-                self.send_header("Content-type", "text/html; charset=utf-8")
-                self.end_headers()
-                
-                # 获取存储目录中的所有文件
-                files = []
-                for filename in os.listdir(STORAGE_DIR):
-                    file_path = os.path.join(STORAGE_DIR, filename)
-                    if os.path.isfile(file_path):
-                        file_size = os.path.getsize(file_path)
-                        files.append({
-                            'name': filename,
-                            'size': format_size(file_size)
-                        })
-                
-                # 按文件名排序
-                files.sort(key=lambda x: x['name'])
-                
-                # 生成文件列表HTML
-                file_list_html = ''
-                for file in files:
-                    file_list_html += f'''<tr>
-                        <td>{file['name']}</td>
-                        <td>{file['size']}</td>
-                        <td><a href="/download?file={file['name']}" class="btn-small">下载</a></td>
-                    </tr>'''
-                
-                html = '''
-                <!DOCTYPE html>
-                <html lang="zh-CN">
-                <head>
-                    <meta charset="UTF-8">
-                    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-                    <title>文件下载</title>
-                    <style>
-                        body {
-                            font-family: Arial, sans-serif;
-                            max-width: 800px;
-                            margin: 50px auto;
-                            text-align: center;
-                            background-color: #f0f0f0;
-                        }
-                        .container {
-                            background: white;
-                            padding: 40px;
-                            border-radius: 10px;
-                            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-                        }
-                        h1 {
-                            color: #333;
-                            margin-bottom: 30px;
-                        }
-                        .btn {
-                            display: inline-block;
-                            background-color: #4CAF50;
-                            color: white;
-                            padding: 15px 30px;
-                            text-decoration: none;
-                            font-size: 18px;
-                            border-radius: 5px;
-                            margin: 10px;
-                            cursor: pointer;
-                            transition: all 0.3s ease;
-                            border: none;
-                        }
-                        .btn:hover {
-                            background-color: #45a049;
-                            transform: translateY(-2px);
-                            box-shadow: 0 4px 15px rgba(0,0,0,0.1);
-                        }
-                        .btn:active {
-                            transform: translateY(0);
-                        }
-                        .btn.secondary {
-                            background-color: #6c757d;
-                            padding: 10px 20px;
-                            font-size: 16px;
-                        }
-                        .btn-small {
-                            background-color: #4CAF50;
-                            color: white;
-                            padding: 8px 15px;
-                            text-decoration: none;
-                            font-size: 14px;
-                            border-radius: 3px;
-                        }
-                        .btn-small:hover {
-                            background-color: #45a049;
-                        }
-                        .theme-toggle {
-                            position: absolute;
-                            top: 20px;
-                            right: 20px;
-                            background: #333;
-                            color: white;
-                            border: none;
-                            padding: 10px 15px;
-                            border-radius: 5px;
-                            cursor: pointer;
-                            font-size: 14px;
-                        }
-                        .theme-toggle:hover {
-                            background: #555;
-                        }
-                        /* 文件列表样式 */
-                        .file-list {
-                            width: 100%;
-                            border-collapse: collapse;
-                            margin: 20px 0;
-                        }
-                        .file-list th,
-                        .file-list td {
-                            padding: 12px;
-                            text-align: left;
-                            border-bottom: 1px solid #ddd;
-                        }
-                        .file-list th {
-                            background-color: #f2f2f2;
-                            font-weight: bold;
-                        }
-                        .file-list tr:hover {
-                            background-color: #f5f5f5;
-                        }
-                        /* 深色主题样式 */
-                        body.dark-theme {
-                            background-color: #121212;
-                            color: white;
-                        }
-                        body.dark-theme .container {
-                            background: #1e1e1e;
-                            color: white;
-                        }
-                        body.dark-theme h1 {
-                            color: white;
-                        }
-                        body.dark-theme .file-list th {
-                            background-color: #2d2d2d;
-                            color: white;
-                        }
-                        body.dark-theme .file-list td {
-                            border-bottom: 1px solid #444;
-                            color: white;
-                        }
-                        body.dark-theme .file-list tr:hover {
-                            background-color: #2d2d2d;
-                        }
-                        body.dark-theme .theme-toggle {
-                            background: #ccc;
-                            color: #333;
-                        }
-                    </style>
-                </head>
-                <body>
-                    <button class="theme-toggle" onclick="toggleTheme()">切换主题</button>
-                    
-                    <div class="container">
-                        <h1>文件下载</h1>
-                        <p>以下是可供下载的文件列表：</p>
-                        
-                        <table class="file-list">
-                            <thead>
-                                <tr>
-                                    <th>文件名</th>
-                                    <th>文件大小</th>
-                                    <th>操作</th>
-                                </tr>
-                            </thead>
-                            <tbody>
-                                {{file_list}}
-                            </tbody>
-                        </table>
-                        
-                        <a href="/" class="btn secondary">返回首页</a>
-                    </div>
-                    
-                    <script>
-                        // 主题切换功能
-                        function toggleTheme() {
-                            document.body.classList.toggle('dark-theme');
-                            // 保存主题设置
-                            const isDark = document.body.classList.contains('dark-theme');
-                            localStorage.setItem('darkTheme', isDark);
-                        }
-                        
-                        // 恢复主题设置
-                        if (localStorage.getItem('darkTheme') === 'true') {
-                            document.body.classList.add('dark-theme');
-                        }
-                        
-                        // 页面加载动画
-                        window.addEventListener('load', function() {
-                            const container = document.querySelector('.container');
-                            container.style.opacity = '0';
-                            container.style.transform = 'translateY(20px)';
-                            
-                            setTimeout(() => {
-                                container.style.transition = 'all 0.5s ease';
-                                container.style.opacity = '1';
-                                container.style.transform = 'translateY(0)';
-                            }, 100);
-                        });
-                    </script>
-                </body>
-                </html>
-                '''
-                
-                # 替换文件列表
-                html = html.replace('{{file_list}}', file_list_html)
-                
-                self.wfile.write(html.encode('utf-8'))
+            elif self.path == "/download_page" or self.path.startswith("/download_page?"):
+                # 显示下载页面，从文件索引中取出当前页的文件
+                query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+                self.send_html(render_download_page(file_index, query))
                 
             elif self.path.startswith("/download"):
                 # 处理文件下载
                 try:
                     # 解析文件名参数
-                    import urllib.parse
                     parsed = urllib.parse.urlparse(self.path)
                     query = urllib.parse.parse_qs(parsed.query)
                     
@@ -503,19 +2478,7 @@ def main():
                         
                         if os.path.isfile(file_path):
                             with open(file_path, 'rb') as f:
-                                self.send_response(200)
-                                self.send_header("Content-type", "application/octet-stream")
-                                self.send_header("Content-Disposition", f"attachment; filename={filename}")
-                                self.send_header("Content-Length", str(os.path.getsize(file_path)))
-                                self.end_headers()
-                                
-                                # 分块发送文件
-                                chunk_size = 8192
-                                while True:
-                                    chunk = f.read(chunk_size)
-                                    if not chunk:
-                                        break
-                                    self.wfile.write(chunk)
+                                self.send_file(f, filename)
                         else:
                             self.send_error(404, f"File not found: {filename}")
                     else:
@@ -525,513 +2488,176 @@ def main():
                 
             elif self.path == "/upload":
                 # 显示上传页面
-                self.send_response(200)
-                self.send_header("Content-type", "text/html; charset=utf-8")
-                self.end_headers()
-                
-                html = '''
-                <!DOCTYPE html>
-                <html lang="zh-CN">
-                <head>
-                    <meta charset="UTF-8">
-                    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-                    <title>文件上传</title>
-                    <style>
-                        body {
-                            font-family: Arial, sans-serif;
-                            max-width: 600px;
-                            margin: 50px auto;
-                            text-align: center;
-                            background-color: #f0f0f0;
-                        }
-                        .container {
-                            background: white;
-                            padding: 40px;
-                            border-radius: 10px;
-                            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-                        }
-                        h1 {
-                            color: #333;
-                        }
-                        .btn {
-                            display: inline-block;
-                            background-color: #4CAF50;
-                            color: white;
-                            padding: 15px 30px;
-                            text-decoration: none;
-                            font-size: 18px;
-                            border-radius: 5px;
-                            margin: 10px;
-                            cursor: pointer;
-                            transition: all 0.3s ease;
-                            border: none;
-                        }
-                        .btn:hover {
-                            background-color: #45a049;
-                            transform: translateY(-2px);
-                            box-shadow: 0 4px 15px rgba(0,0,0,0.1);
-                        }
-                        .btn:active {
-                            transform: translateY(0);
-                        }
-                        .btn.secondary {
-                            background-color: #6c757d;
-                            padding: 10px 20px;
-                            font-size: 16px;
-                        }
-                        .btn.secondary:hover {
-                            background-color: #5a6268;
-                        }
-                        .btn:disabled {
-                            background-color: #ccc;
-                            cursor: not-allowed;
-                            transform: none;
-                            box-shadow: none;
-                        }
-                        .file-input {
-                            margin: 20px 0;
-                            padding: 10px;
-                            border: 2px dashed #ccc;
-                            border-radius: 5px;
-                            background: #f8f9fa;
-                        }
-                        .file-input input[type="file"] {
-                            margin: 10px 0;
-                            font-size: 16px;
-                        }
-                        .success {
-                            color: #28a745;
-                            margin: 20px 0;
-                            padding: 15px;
-                            background: #d4edda;
-                            border-radius: 5px;
-                        }
-                        .error {
-                            color: #dc3545;
-                            margin: 20px 0;
-                            padding: 15px;
-                            background: #f8d7da;
-                            border-radius: 5px;
-                        }
-                        .theme-toggle {
-                            position: absolute;
-                            top: 20px;
-                            right: 20px;
-                            background: #333;
-                            color: white;
-                            border: none;
-                            padding: 10px 15px;
-                            border-radius: 5px;
-                            cursor: pointer;
-                            font-size: 14px;
-                        }
-                        .theme-toggle:hover {
-                            background: #555;
-                        }
-                        /* 进度条样式 */
-                        .progress-container {
-                            margin: 20px 0;
-                            display: none;
-                        }
-                        .progress-bar {
-                            width: 100%;
-                            height: 20px;
-                            background-color: #e0e0e0;
-                            border-radius: 10px;
-                            overflow: hidden;
-                            margin: 10px 0;
-                        }
-                        .progress-fill {
-                            height: 100%;
-                            background-color: #4CAF50;
-                            width: 0%;
-                            transition: width 0.3s ease;
-                            border-radius: 10px;
-                        }
-                        .progress-info {
-                            font-size: 14px;
-                            color: #666;
-                            margin: 10px 0;
-                            line-height: 1.5;
-                        }
-                        .progress-details {
-                            display: flex;
-                            justify-content: space-between;
-                            margin-top: 10px;
-                            font-size: 12px;
-                            color: #888;
-                        }
-                        /* 深色主题样式 */
-                        body.dark-theme {
-                            background-color: #121212;
-                            color: white;
-                        }
-                        body.dark-theme .container {
-                            background: #1e1e1e;
-                            color: white;
-                        }
-                        body.dark-theme h1 {
-                            color: white;
-                        }
-                        body.dark-theme .file-input {
-                            background: #2d2d2d;
-                            border-color: #555;
-                            color: white;
-                        }
-                        body.dark-theme .success {
-                            background: #155724;
-                            color: #d4edda;
-                        }
-                        body.dark-theme .error {
-                            background: #721c24;
-                            color: #f8d7da;
-                        }
-                        body.dark-theme .theme-toggle {
-                            background: #ccc;
-                            color: #333;
-                        }
-                        body.dark-theme .progress-bar {
-                            background-color: #333;
-                        }
-                        body.dark-theme .progress-info {
-                            color: #ccc;
-                        }
-                        body.dark-theme .progress-details {
-                            color: #aaa;
-                        }
-                    </style>
-                </head>
-                <body>
-                    <button class="theme-toggle" onclick="toggleTheme()">切换主题</button>
-                    
-                    <div class="container">
-                        <h1>文件上传</h1>
-                        <p>请选择要上传的文件：</p>
-                        
-                        <form id="uploadForm" enctype="multipart/form-data">
-                            <div class="file-input">
-                                <input type="file" id="fileInput" name="file" required multiple>
-                            </div>
-                            <button type="submit" class="btn" id="uploadBtn">上传文件</button>
-                        </form>
-                        
-                        <!-- 进度条 -->
-                        <div class="progress-container" id="progressContainer">
-                            <div class="progress-info" id="progressInfo">准备上传...</div>
-                            <div class="progress-bar">
-                                <div class="progress-fill" id="progressFill"></div>
-                            </div>
-                            <div class="progress-details">
-                                <span id="speed">网速: 0 B/s</span>
-                                <span id="timeElapsed">已用时间: 00:00</span>
-                                <span id="timeRemaining">剩余时间: --:--</span>
-                            </div>
-                        </div>
-                        
-                        <a href="/" class="btn secondary">返回首页</a>
-                    </div>
-                    
-                    <script>
-                        // 主题切换功能
-                        function toggleTheme() {
-                            document.body.classList.toggle('dark-theme');
-                            // 保存主题设置
-                            const isDark = document.body.classList.contains('dark-theme');
-                            localStorage.setItem('darkTheme', isDark);
-                        }
-                        
-                        // 恢复主题设置
-                        if (localStorage.getItem('darkTheme') === 'true') {
-                            document.body.classList.add('dark-theme');
-                        }
-                        
-                        // 页面加载动画
-                        window.addEventListener('load', function() {
-                            const container = document.querySelector('.container');
-                            container.style.opacity = '0';
-                            container.style.transform = 'translateY(20px)';
-                            
-                            setTimeout(() => {
-                                container.style.transition = 'all 0.5s ease';
-                                container.style.opacity = '1';
-                                container.style.transform = 'translateY(0)';
-                            }, 100);
-                        });
-                        
-                        // 文件上传进度功能
-                        document.getElementById('uploadForm').addEventListener('submit', function(e) {
-                            e.preventDefault();
-                            
-                            const fileInput = document.getElementById('fileInput');
-                            const files = fileInput.files;
-                            if (files.length === 0) {
-                                alert('请选择要上传的文件');
-                                return;
-                            }
-                            
-                            // 显示进度条
-                            const progressContainer = document.getElementById('progressContainer');
-                            const progressFill = document.getElementById('progressFill');
-                            const progressInfo = document.getElementById('progressInfo');
-                            const speedElement = document.getElementById('speed');
-                            const timeElapsedElement = document.getElementById('timeElapsed');
-                            const timeRemainingElement = document.getElementById('timeRemaining');
-                            const uploadBtn = document.getElementById('uploadBtn');
-                            
-                            progressContainer.style.display = 'block';
-                            uploadBtn.disabled = true;
-                            uploadBtn.textContent = '上传中...';
-                            
-                            // 创建FormData
-                            const formData = new FormData();
-                            for (let i = 0; i < files.length; i++) {
-                                formData.append('file', files[i]);
-                            }
-                            
-                            // 初始化进度跟踪变量
-                            let startTime = Date.now();
-                            let lastUpdateTime = startTime;
-                            let lastLoaded = 0;
-                            
-                            // 创建XMLHttpRequest
-                            const xhr = new XMLHttpRequest();
-                            
-                            // 监听进度事件
-                            xhr.upload.addEventListener('progress', function(e) {
-                                if (e.lengthComputable) {
-                                    const now = Date.now();
-                                    const elapsed = now - startTime;
-                                    const sinceLastUpdate = now - lastUpdateTime;
-                                    
-                                    const loaded = e.loaded;
-                                    const total = e.total;
-                                    const percent = Math.round((loaded / total) * 100);
-                                    
-                                    // 计算网速
-                                    const bytesSinceLastUpdate = loaded - lastLoaded;
-                                    const speedBps = bytesSinceLastUpdate / (sinceLastUpdate / 1000);
-                                    
-                                    // 更新进度条
-                                    progressFill.style.width = percent + '%';
-                                    progressInfo.textContent = `上传进度: ${percent}% (${formatFileSize(loaded)} / ${formatFileSize(total)})`;
-                                    
-                                    // 更新网速
-                                    speedElement.textContent = `网速: ${formatSpeed(speedBps)}`;
-                                    
-                                    // 更新已用时间
-                                    timeElapsedElement.textContent = `已用时间: ${formatTime(elapsed)}`;
-                                    
-                                    // 计算并更新剩余时间
-                                    if (percent > 0 && percent < 100) {
-                                        const estimatedTotalTime = (elapsed / percent) * 100;
-                                        const remainingTime = estimatedTotalTime - elapsed;
-                                        timeRemainingElement.textContent = `剩余时间: ${formatTime(remainingTime)}`;
-                                    } else {
-                                        timeRemainingElement.textContent = `剩余时间: --:--`;
-                                    }
-                                    
-                                    // 更新最后更新时间和已加载字节数
-                                    lastUpdateTime = now;
-                                    lastLoaded = loaded;
-                                }
-                            });
-                            
-                            // 上传完成事件
-                            xhr.addEventListener('load', function() {
-                                if (xhr.status === 200) {
-                                    // 上传成功，显示结果
-                                    document.open();
-                                    document.write(xhr.responseText);
-                                    document.close();
-                                } else {
-                                    progressInfo.textContent = `上传失败: ${xhr.statusText}`;
-                                    uploadBtn.disabled = false;
-                                    uploadBtn.textContent = '上传文件';
-                                }
-                            });
-                            
-                            // 上传错误事件
-                            xhr.addEventListener('error', function() {
-                                progressInfo.textContent = '上传失败: 网络错误';
-                                uploadBtn.disabled = false;
-                                uploadBtn.textContent = '上传文件';
-                            });
-                            
-                            // 发送请求
-                            xhr.open('POST', '/upload', true);
-                            xhr.send(formData);
-                        });
-                        
-                        // 格式化文件大小
-                        function formatFileSize(bytes) {
-                            if (bytes === 0) return '0 B';
-                            const k = 1024;
-                            const sizes = ['B', 'KB', 'MB', 'GB'];
-                            const i = Math.floor(Math.log(bytes) / Math.log(k));
-                            return parseFloat((bytes / Math.pow(k, i)).toFixed(2)) + ' ' + sizes[i];
-                        }
-                        
-                        // 格式化网速
-                        function formatSpeed(bps) {
-                            if (bps < 1024) return bps.toFixed(0) + ' B/s';
-                            if (bps < 1024 * 1024) return (bps / 1024).toFixed(2) + ' KB/s';
-                            return (bps / (1024 * 1024)).toFixed(2) + ' MB/s';
-                        }
-                        
-                        // 格式化时间（毫秒转为 mm:ss）
-                        function formatTime(ms) {
-                            const totalSeconds = Math.floor(ms / 1000);
-                            const minutes = Math.floor(totalSeconds / 60);
-                            const seconds = totalSeconds % 60;
-                            return `${minutes.toString().padStart(2, '0')}:${seconds.toString().padStart(2, '0')}`;
-                        }
-                    </script>
-                </body>
-                </html>
-                '''
-                
-                self.wfile.write(html.encode('utf-8'))
+                self.send_static_page(static_pages["/upload"])
+            elif self.path.startswith("/upload/success"):
+                # 分块上传全部完成后的结果页面
+                query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+                try:
+                    success_count = int(query.get('count', ['0'])[0])
+                except ValueError:
+                    success_count = 0
+                self.send_upload_success(success_count)
             else:
                 # 其他路径返回404
                 self.send_error(404, "Not Found")
-        
+
+        def do_HEAD(self):
+            # 查询上传会话当前的偏移，或只获取静态页面的响应头
+            if self.path.startswith("/upload/sessions/"):
+                self.handle_upload_session()
+            elif self.path in static_pages:
+                self.send_static_page(static_pages[self.path])
+            else:
+                self.send_error(404, "Not Found")
+
+        def do_PATCH(self):
+            # 向上传会话写入数据块
+            if self.path.startswith("/upload/sessions/"):
+                self.handle_upload_session()
+            else:
+                self.send_error(404, "Not Found")
+
+        def do_DELETE(self):
+            # 放弃上传会话
+            if self.path.startswith("/upload/sessions/"):
+                self.handle_upload_session()
+            else:
+                self.send_error(404, "Not Found")
+
+        def send_response_headers(self, status, headers):
+            self.send_response(status)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+
+        def send_static_page(self, page):
+            # 发送预编码的静态页面，支持压缩协商和If-None-Match
+            status, headers, body = page.respond(self.headers)
+            self.send_response_headers(status, headers)
+            if body and self.command != 'HEAD':
+                self.wfile.write(body)
+
+        def send_html(self, html, status=200):
+            body = html.encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def send_json(self, status, data):
+            body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def handle_api_files(self):
+            # JSON格式的文件列表，游标分页，参数见api_files
+            query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            self.send_json(*api_files(file_index, query))
+
+        def send_upload_session(self, status, meta=None, location=None):
+            self.send_response_headers(status, upload_session_headers(meta, upload_sessions.ttl, location))
+
+        def handle_upload_session(self):
+            """
+            可续传上传接口
+            POST   /upload/sessions        创建会话（Upload-Length, Upload-Metadata: filename <base64>）
+            HEAD   /upload/sessions/<id>   查询已连续收到的偏移
+            PATCH  /upload/sessions/<id>   在Upload-Offset处写入请求体，数据块可并行发送
+            DELETE /upload/sessions/<id>   放弃上传
+            """
+            try:
+                if self.command == "POST":
+                    meta = upload_sessions.create(*parse_session_create(self.headers))
+                    if meta.get('completed'):
+                        file_index.update(meta['filename'])
+                    self.send_upload_session(201, meta, f"/upload/sessions/{meta['id']}")
+                    return
+
+                upload_id = self.path[len("/upload/sessions/"):].split('?', 1)[0]
+                if self.command == "HEAD":
+                    self.send_upload_session(200, upload_sessions.get(upload_id))
+                elif self.command == "DELETE":
+                    upload_sessions.delete(upload_id)
+                    self.send_upload_session(204)
+                else:
+                    offset, count = parse_session_patch(self.headers)
+                    meta = upload_sessions.write(upload_id, offset, self.rfile, count)
+                    if meta.get('completed'):
+                        file_index.update(meta['filename'])
+                    self.send_upload_session(204, meta)
+            except UploadSessionError as e:
+                self.send_error(e.status, explain=str(e))
+            except Exception as e:
+                self.send_error(500, f"Server Error: {e}")
+
         def do_POST(self):
+            if self.path == "/upload/sessions":
+                self.handle_upload_session()
+                return
             # 处理文件上传
             if self.path == "/upload":
                 try:
-                    content_type = self.headers['Content-Type']
-                    if not content_type.startswith('multipart/form-data'):
+                    # 解析boundary
+                    boundary = parse_multipart_boundary(self.headers['Content-Type'])
+                    if not boundary:
                         self.send_error(400, "Invalid content type")
                         return
                     
-                    # 解析boundary
-                    boundary = content_type.split('boundary=')[1].encode('utf-8')
-                    
                     # 获取内容长度
                     content_length = int(self.headers['Content-Length'])
-                    
-                    # 读取所有内容
-                    content = self.rfile.read(content_length)
-                    
-                    # 分割multipart内容
-                    parts = content.split(b'--' + boundary)
-                    
+
+                    # 流式解析multipart内容，按块读取并直接写入磁盘
+                    reader = MultipartReader(self.rfile, boundary, content_length)
+
                     success_count = 0
-                    
+
                     # 遍历所有部分
-                    for part in parts[1:-1]:  # 跳过第一个空部分和最后一个结束部分
-                        part = part.strip()
-                        if not part:
-                            continue
-                        
-                        # 查找头部和内容的分隔符
-                        header_end = part.find(b'\r\n\r\n')
-                        if header_end == -1:
+                    for headers, body in reader.parts():
+                        # 只处理有文件名的部分（文件字段）
+                        filename = parse_part_filename(headers)
+                        if not filename:
                             continue
-                        
-                        # 解析头部
-                        headers = part[:header_end].decode('utf-8')
-                        
-                        # 查找文件名
-                        filename = None
-                        if 'filename="' in headers:
-                            filename_start = headers.find('filename="') + 10
-                            filename_end = headers.find('"', filename_start)
-                            filename = headers[filename_start:filename_end]
-                            
-                            # 只处理有文件名的部分（文件字段）
-                            if filename:
-                                filename = os.path.basename(filename)
-                                # 获取文件内容
-                                file_content = part[header_end + 4:]  # 跳过\r\n\r\n
-                                # 构建保存路径
-                                save_path = os.path.join(STORAGE_DIR, filename)
-                                
-                                # 保存文件
-                                with open(save_path, 'wb') as f:
-                                    f.write(file_content)
-                                success_count += 1
-                        
-                    # 构建上传成功页面
-                    self.send_response(200)
-                    self.send_header("Content-type", "text/html; charset=utf-8")
-                    self.end_headers()
-                    
-                    # 使用普通字符串并手动替换变量，避免CSS大括号与f-string冲突
-                    html = '''
-                    <!DOCTYPE html>
-                    <html lang="zh-CN">
-                    <head>
-                        <meta charset="UTF-8">
-                        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-                        <title>上传成功</title>
-                        <style>
-                            body {
-                                font-family: Arial, sans-serif;
-                                max-width: 600px;
-                                margin: 50px auto;
-                                text-align: center;
-                                background-color: #f0f0f0;
-                            }
-                            .container {
-                                background: white;
-                                padding: 20px;
-                                border-radius: 5px;
-                                box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-                            }
-                            h1 {
-                                color: #333;
-                            }
-                            .btn {
-                                display: inline-block;
-                                background-color: #4CAF50;
-                                color: white;
-                                padding: 10px 20px;
-                                text-decoration: none;
-                                font-size: 16px;
-                                border-radius: 3px;
-                                margin: 10px;
-                                cursor: pointer;
-                                border: none;
-                            }
-                            .btn:hover {
-                                background-color: #45a049;
-                            }
-                            .btn.secondary {
-                                background-color: #6c757d;
-                            }
-                            .success {
-                                color: #28a745;
-                                margin: 20px 0;
-                                padding: 10px;
-                                background: #d4edda;
-                                border-radius: 3px;
-                            }
-                        </style>
-                    </head>
-                    <body>
-                        <div class="container">
-                            <h1>上传成功</h1>
-                            <div class="success">
-                                <p>成功上传 {{success_count}} 个文件</p>
-                            </div>
-                            <a href="/upload" class="btn">继续上传</a>
-                            <a href="/" class="btn secondary">返回首页</a>
-                        </div>
-                    </body>
-                    </html>
-                    '''
-                    
-                    # 手动替换变量
-                    html = html.replace('{{success_count}}', str(success_count))
-                    
-                    self.wfile.write(html.encode('utf-8'))
+
+                        # 构建保存路径
+                        save_path = os.path.join(STORAGE_DIR, filename)
+
+                        # 保存文件
+                        with open(save_path, 'wb') as f:
+                            for chunk in body:
+                                f.write(chunk)
+                        file_index.update(filename)
+                        success_count += 1
+
+                    self.send_upload_success(success_count)
                     
+                except MultipartError as e:
+                    self.send_error(400, f"Bad Request: {e}")
                 except Exception as e:
                     self.send_error(500, f"Server Error: {e}")
             else:
                 self.send_error(404, "Not Found")
         
+        def send_upload_success(self, success_count):
+            # 构建上传成功页面
+            self.send_html(render_upload_success(success_count))
+
+        def send_file(self, f, filename):
+            # 发送文件，支持Range/If-Range断点续传和多段下载
+            plan = plan_file_response(self.headers, os.fstat(f.fileno()), filename)
+            self.send_response_headers(plan.status, plan.headers)
+            for prefix, offset, count in plan.segments:
+                if prefix:
+                    self.wfile.write(prefix)
+                # 发送文件内容（sendfile零拷贝，必要时退回缓冲拷贝）
+                send_file_range(self, f, offset, count)
+            if plan.trailer:
+                self.wfile.write(plan.trailer)
+
         # 启用请求日志
         def log_message(self, format, *args):
             import datetime
@@ -1040,14 +2666,36 @@ def main():
     
     # 启动服务器
     try:
-        # 使用多线程服务器，支持并发连接
-        with socketserver.ThreadingTCPServer(("", PORT), MyHandler) as httpd:
+        if ENGINE == "asyncio":
+            # asyncio引擎，单线程事件循环处理所有连接
             print(f"服务器已启动，本地访问地址: http://127.0.0.1:{PORT}")
-            print("服务器类型: 多线程 (ThreadingTCPServer)")
+            print("服务器类型: asyncio (AsyncFileServer)")
             print("最大并发连接数: 无限制 (系统资源限制)")
             print("请将此本地服务通过隧道工具暴露到公网")
             print("按 Ctrl+C 停止服务器")
             print("=" * 50)
+            asyncio.run(AsyncFileServer(file_index, upload_sessions, static_pages).serve("", PORT, BACKLOG))
+            return
+
+        if THREADS > 0:
+            # 固定大小线程池，超出排队上限的连接直接返回503
+            httpd = PooledTCPServer(("", PORT), MyHandler, THREADS, BACKLOG, QUEUE_SIZE, RETRY_AFTER)
+            server_type = f"线程池 (PooledTCPServer, {THREADS} 个工作线程)"
+            max_connections = f"{THREADS} 个处理中 + {QUEUE_SIZE} 个排队，超出返回503"
+        else:
+            # 使用多线程服务器，支持并发连接
+            class ThreadingServer(socketserver.ThreadingTCPServer):
+                request_queue_size = BACKLOG
+            httpd = ThreadingServer(("", PORT), MyHandler)
+            server_type = "多线程 (ThreadingTCPServer)"
+            max_connections = "无限制 (系统资源限制)"
+        with httpd:
+            print(f"服务器已启动，本地访问地址: http://127.0.0.1:{PORT}")
+            print(f"服务器类型: {server_type}")
+            print(f"最大并发连接数: {max_connections}")
+            print("请将此本地服务通过隧道工具暴露到公网")
+            print("按 Ctrl+C 停止服务器")
+            print("=" * 50)
             
             # 运行服务器
             httpd.serve_forever()